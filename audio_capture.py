@@ -0,0 +1,311 @@
+import threading
+import time
+import wave
+import weakref
+import pyaudio
+
+
+class AudioRingBuffer:
+    """Preallocated single-writer ring buffer of raw PCM bytes.
+
+    The capture thread is the only writer and, for live input, never waits on readers.
+    Each reader keeps its own cursor, so any number of consumers can fan out from one
+    device read. With `backpressure` set (replaying faster than real time), the writer
+    waits in `wait_for_space` for the slowest reader instead of overwriting its audio.
+    """
+
+    def __init__(self, capacity_bytes, frame_bytes):
+        # Keep the capacity a whole number of frames so cursors never split a sample.
+        self.capacity = capacity_bytes - (capacity_bytes % frame_bytes)
+        self.frame_bytes = frame_bytes
+        self._buffer = bytearray(self.capacity)
+        self._view = memoryview(self._buffer)
+        self.write_pos = 0  # Total bytes ever written; only the writer advances it.
+        self.write_chunk = 0  # Largest single write so far: the span the writer may be overwriting.
+        self.dropped_bytes = 0  # Bytes lost across all readers that fell behind.
+        self.closed = False
+        self.backpressure = False
+        self._subscribers = weakref.WeakSet()
+        self._data_ready = threading.Condition()
+        self._space_ready = threading.Condition()
+        self._drop_lock = threading.Lock()
+
+    def write(self, data):
+        """Copies one chunk into the ring and publishes it to readers."""
+        size = len(data)
+        if size > self.capacity:
+            data = data[-self.capacity:]
+            self.write_pos += size - self.capacity
+            size = self.capacity
+        self.write_chunk = max(self.write_chunk, size)
+
+        start = self.write_pos % self.capacity
+        head = min(size, self.capacity - start)
+        self._view[start:start + head] = data[:head]
+        if head < size:
+            self._view[:size - head] = data[head:]
+
+        # Publish only after the bytes are in place.
+        self.write_pos += size
+        with self._data_ready:
+            self._data_ready.notify_all()
+
+    def close(self):
+        """Marks the stream finished and wakes every waiting reader."""
+        self.closed = True
+        with self._data_ready:
+            self._data_ready.notify_all()
+
+    def wait_for(self, position, timeout=None):
+        """Blocks until `position` bytes have been written or the ring is closed."""
+        with self._data_ready:
+            return self._data_ready.wait_for(
+                lambda: self.write_pos >= position or self.closed, timeout=timeout
+            )
+
+    def _has_space(self, size):
+        # Every reader must still be within readable_bytes once `size` more bytes are written.
+        oldest_allowed = self.write_pos + size - (self.capacity - max(self.write_chunk, size))
+        return all(subscriber.position >= oldest_allowed for subscriber in list(self._subscribers))
+
+    def wait_for_space(self, size, timeout=None):
+        """Blocks until writing `size` bytes would not overrun any open reader."""
+        with self._space_ready:
+            return self._space_ready.wait_for(lambda: self._has_space(size), timeout=timeout)
+
+    def notify_space(self):
+        with self._space_ready:
+            self._space_ready.notify_all()
+
+    @property
+    def readable_bytes(self):
+        """How far a reader may lag before it overlaps the chunk being written."""
+        return self.capacity - self.write_chunk
+
+    def copy(self, start, end):
+        """Returns bytes [start, end) of the stream, wrapping around the ring."""
+        size = end - start
+        offset = start % self.capacity
+        head = min(size, self.capacity - offset)
+        if head == size:
+            return bytes(self._view[offset:offset + size])
+        return bytes(self._view[offset:]) + bytes(self._view[:size - head])
+
+    def subscribe(self, preroll_bytes=0):
+        """Creates a reader positioned `preroll_bytes` behind the live edge."""
+        preroll_bytes = min(preroll_bytes, self.readable_bytes, self.write_pos)
+        preroll_bytes -= preroll_bytes % self.frame_bytes
+        subscriber = RingSubscriber(self, self.write_pos - preroll_bytes)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+
+class RingSubscriber:
+    """Independent read cursor over an AudioRingBuffer."""
+
+    def __init__(self, ring, position):
+        self.ring = ring
+        self.position = position
+        self.dropped_bytes = 0
+
+    def _skip_overrun(self):
+        lag = self.ring.write_pos - self.position
+        if lag > self.ring.readable_bytes:
+            # The writer lapped us; jump to the oldest bytes it cannot be overwriting.
+            skipped = lag - self.ring.readable_bytes
+            self.dropped_bytes += skipped
+            self.position += skipped
+            with self.ring._drop_lock:
+                self.ring.dropped_bytes += skipped
+
+    def read(self, size, timeout=None):
+        """Returns exactly `size` bytes, or None once capture has stopped (or on timeout)."""
+        while True:
+            if not self.ring.wait_for(self.position + size, timeout=timeout):
+                return None
+            if self.ring.write_pos < self.position + size:
+                return None  # Closed before enough audio arrived.
+
+            self._skip_overrun()
+            data = self.ring.copy(self.position, self.position + size)
+            # If the writer reached our span while copying (the chunk it is writing now
+            # included), the data may be torn.
+            if self.ring.write_pos - self.position > self.ring.readable_bytes:
+                continue
+            self.position += size
+            if self.ring.backpressure:
+                self.ring.notify_space()
+            return data
+
+    def close(self):
+        """Stops holding back the writer; call once this reader is done."""
+        self.ring._subscribers.discard(self)
+        self.ring.notify_space()
+
+    def read_frames(self, num_frames, timeout=None):
+        """Reads `num_frames` sample frames from the ring."""
+        return self.read(num_frames * self.ring.frame_bytes, timeout=timeout)
+
+    @property
+    def dropped_frames(self):
+        return self.dropped_bytes // self.ring.frame_bytes
+
+
+class MicrophoneSource:
+    """Live PyAudio input stream."""
+
+    def __init__(self, pa, rate=16000, channels=1, audio_format=pyaudio.paInt16, chunk=512):
+        self.pa = pa
+        self.rate = rate
+        self.channels = channels
+        self.audio_format = audio_format
+        self.chunk = chunk
+        self.sample_width = pyaudio.get_sample_size(audio_format)
+        self._stream = None
+
+    def open(self):
+        self._stream = self.pa.open(
+            format=self.audio_format,
+            channels=self.channels,
+            rate=self.rate,
+            input=True,
+            frames_per_buffer=self.chunk
+        )
+
+    def read(self):
+        return self._stream.read(self.chunk, exception_on_overflow=False)
+
+    def close(self):
+        self._stream.stop_stream()
+        self._stream.close()
+
+
+class ReplaySource:
+    """Plays recorded PCM through the capture path, for runs without audio hardware.
+
+    `speed` 1.0 paces chunks in real time, 2.0 twice as fast, 0 as fast as possible.
+    `read` returns None once the audio is exhausted, which ends the capture.
+
+    Faster than real time the consumers can't be expected to keep up, so the capture
+    waits for the slowest one (`backpressure`) rather than dropping audio. At real time
+    or slower it behaves like the microphone and dropped frames are reported as such.
+    """
+
+    def __init__(self, pcm, rate=16000, channels=1, sample_width=2, chunk=512, speed=1.0):
+        self.pcm = memoryview(pcm)
+        self.rate = rate
+        self.channels = channels
+        self.sample_width = sample_width
+        self.chunk = chunk
+        self.speed = speed
+        self._chunk_bytes = chunk * sample_width * channels
+        self._offset = 0
+        self._started = None
+
+    @classmethod
+    def from_wav(cls, path, chunk=512, speed=1.0):
+        with wave.open(path, 'rb') as wf:
+            pcm = wf.readframes(wf.getnframes())
+            return cls(pcm, rate=wf.getframerate(), channels=wf.getnchannels(),
+                       sample_width=wf.getsampwidth(), chunk=chunk, speed=speed)
+
+    @property
+    def backpressure(self):
+        return not self.speed or self.speed > 1
+
+    @property
+    def duration(self):
+        return len(self.pcm) / (self.rate * self.sample_width * self.channels)
+
+    def open(self):
+        self._offset = 0
+        self._started = time.perf_counter()
+
+    def read(self):
+        if self._offset + self._chunk_bytes > len(self.pcm):
+            return None
+        if self.speed:
+            # Sleep until the wall clock catches up with the audio clock.
+            due = self._started + (self._offset / (self.rate * self.sample_width * self.channels)) / self.speed
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        data = self.pcm[self._offset:self._offset + self._chunk_bytes]
+        self._offset += self._chunk_bytes
+        return data
+
+    def close(self):
+        pass
+
+
+class AudioCapture:
+    """Owns the single audio source and feeds every consumer through one ring buffer."""
+
+    def __init__(self, source, buffer_seconds=10):
+        self.source = source
+        self.rate = source.rate
+        self.chunk = source.chunk
+        self.sample_width = source.sample_width
+        self.frame_bytes = source.sample_width * source.channels
+        self.ring = AudioRingBuffer(int(self.rate * buffer_seconds) * self.frame_bytes, self.frame_bytes)
+        self.ring.backpressure = getattr(source, "backpressure", False)
+        self.cpu_seconds = 0.0
+        self.backpressure_seconds = 0.0  # Time the writer spent waiting for slow readers
+        self._running = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._running.is_set():
+            return
+        self.source.open()
+        self._running.set()
+        self._thread = threading.Thread(target=self._capture_loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running.clear()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def wait(self, timeout=None):
+        """Blocks until the source is exhausted or capture is stopped."""
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def subscribe(self, preroll_seconds=0.0):
+        """Returns a reader starting `preroll_seconds` before now (bounded by the ring size)."""
+        return self.ring.subscribe(int(self.rate * preroll_seconds) * self.frame_bytes)
+
+    @property
+    def dropped_frames(self):
+        return self.ring.dropped_bytes // self.frame_bytes
+
+    def _capture_loop(self):
+        print("🎤 Shared audio capture started.")
+        try:
+            while self._running.is_set():
+                data = self.source.read()
+                if data is None:
+                    break
+                if self.ring.backpressure:
+                    waited = time.perf_counter()
+                    while self._running.is_set() and not self.ring.wait_for_space(len(data), timeout=0.1):
+                        pass
+                    self.backpressure_seconds += time.perf_counter() - waited
+                self.ring.write(data)
+        except Exception as e:
+            print(f"❌ Error in audio capture: {e}")
+        finally:
+            self.cpu_seconds = time.thread_time()
+            self.source.close()
+            self.ring.close()
+            print("🔇 Shared audio capture stopped.")
+
+
+class MicrophoneCapture(AudioCapture):
+    """AudioCapture reading from the default PyAudio input device."""
+
+    def __init__(self, pa, rate=16000, channels=1, audio_format=pyaudio.paInt16,
+                 chunk=512, buffer_seconds=10):
+        super().__init__(MicrophoneSource(pa, rate, channels, audio_format, chunk), buffer_seconds)
@@ -0,0 +1,192 @@
+"""Replays a WAV file through the audio pipeline in main.py and reports its cost.
+
+Runs the real continuous_recording, live_transcription, detect_wake_word and
+record_after_wake_word threads against a ReplaySource instead of the microphone:
+
+    python bench_audio_pipeline.py lesson.wav --speed 4 --stt vosk --wake-at 12.5 40
+
+Without PICOVOICE_API_KEY, wake words are fired at the --wake-at offsets so the run
+stays deterministic on CI machines.
+"""
+import argparse
+import functools
+import json
+import os
+import resource
+import tempfile
+import threading
+import time
+
+from audio_capture import AudioCapture, ReplaySource
+from transcription import get_transcriber
+from voice_activity import EnergyEndpointer
+import main
+
+
+class ScheduledWakeWord:
+    """Stand-in for Porcupine that fires at fixed offsets into the replayed audio."""
+
+    def __init__(self, wake_times, sample_rate=16000, frame_length=512):
+        self.sample_rate = sample_rate
+        self.frame_length = frame_length
+        self.pending = sorted(wake_times)
+        self.frames_seen = 0
+
+    def process(self, pcm):
+        self.frames_seen += len(pcm)
+        if self.pending and self.frames_seen / self.sample_rate >= self.pending[0]:
+            self.pending.pop(0)
+            return 0
+        return -1
+
+    def delete(self):
+        pass
+
+
+def rss_bytes():
+    """Current resident set size, falling back to the peak where /proc is unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class PipelineProbe:
+    """Wraps the thread functions in main.py to collect per-thread CPU and wall time."""
+
+    def __init__(self):
+        self.stats = {}
+        self.command_latencies = []
+        self._command = threading.local()  # When this thread's command endpointer stopped
+        self._active = 0
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+
+    def wrap(self, name, func):
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            with self._lock:
+                self._active += 1
+            self._command.endpoint_at = None
+            wall_start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                wall = time.perf_counter() - wall_start
+                with self._lock:
+                    entry = self.stats.setdefault(name, {"runs": 0, "cpu_seconds": 0.0, "wall_seconds": 0.0})
+                    entry["runs"] += 1
+                    entry["cpu_seconds"] += time.thread_time()
+                    entry["wall_seconds"] += wall
+                    if name == "record_after_wake_word" and self._command.endpoint_at is not None:
+                        # From the end of the spoken command to the transcript, independent of --speed
+                        self.command_latencies.append(time.perf_counter() - self._command.endpoint_at)
+                    self._active -= 1
+                    self._idle.notify_all()
+        return timed
+
+    def endpointer_class(self):
+        """EnergyEndpointer that notes when it ends a command capture."""
+        probe = self
+
+        class TimedEndpointer(EnergyEndpointer):
+            def feed(self, pcm):
+                stop = super().feed(pcm)
+                if stop:
+                    probe._command.endpoint_at = time.perf_counter()
+                return stop
+
+        return TimedEndpointer
+
+    def wait_idle(self, timeout=None):
+        with self._idle:
+            return self._idle.wait_for(lambda: self._active == 0, timeout=timeout)
+
+
+def run_benchmark(wav_path, speed=1.0, stt=None, wake_times=(), segment_seconds=None, drain_timeout=120):
+    source = ReplaySource.from_wav(wav_path, chunk=main.CHUNK, speed=speed)
+    probe = PipelineProbe()
+    for name in ("continuous_recording", "live_transcription", "detect_wake_word", "record_after_wake_word"):
+        setattr(main, name, probe.wrap(name, getattr(main, name)))
+    main.EnergyEndpointer = probe.endpointer_class()
+
+    main.transcriber = get_transcriber(stt)
+    if not main.PICOVOICE_API_KEY:
+        main.porcupine = ScheduledWakeWord(wake_times, source.rate, main.CHUNK)
+    if segment_seconds:
+        main.SEGMENT_SECONDS = segment_seconds
+
+    # Segments, the recordings table and transcripts all land in a scratch directory.
+    workdir = tempfile.mkdtemp(prefix="audio_bench_")
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        rss_start = rss_bytes()
+        wall_start = time.perf_counter()
+        capture = AudioCapture(source, buffer_seconds=main.CAPTURE_BUFFER_SECONDS)
+        main.start_audio_pipeline(capture)
+        capture.wait()
+        replay_wall = time.perf_counter() - wall_start
+        main.stop_audio_pipeline()
+        drained = probe.wait_idle(timeout=drain_timeout)
+        rss_end = rss_bytes()
+    finally:
+        os.chdir(cwd)
+
+    audio_hours = source.duration / 3600
+    return {
+        "audio_seconds": round(source.duration, 2),
+        "replay_wall_seconds": round(replay_wall, 2),
+        "speed": speed,
+        "stt_backend": main.transcriber.name,
+        "dropped_frames": capture.dropped_frames,
+        "backpressure_seconds": round(capture.backpressure_seconds, 2) if capture.ring.backpressure else None,
+        "capture_cpu_seconds": round(capture.cpu_seconds, 3),
+        "threads": {name: {k: round(v, 3) if isinstance(v, float) else v for k, v in entry.items()}
+                    for name, entry in probe.stats.items()},
+        "endpoint_to_transcript_seconds": [round(latency, 3) for latency in probe.command_latencies],
+        "rss_growth_mb_per_hour": round((rss_end - rss_start) / 2**20 / audio_hours, 1) if audio_hours else None,
+        "drained": drained,
+        "output_dir": workdir,
+    }
+
+
+def print_report(report):
+    print("\n📊 Audio pipeline benchmark")
+    print(f"  audio: {report['audio_seconds']}s replayed in {report['replay_wall_seconds']}s "
+          f"(speed {report['speed']}, STT {report['stt_backend']})")
+    print(f"  dropped frames: {report['dropped_frames']}")
+    if report["backpressure_seconds"] is not None:
+        print(f"  capture waited {report['backpressure_seconds']}s for consumers to keep up")
+    print(f"  capture thread CPU: {report['capture_cpu_seconds']}s")
+    for name, entry in report["threads"].items():
+        print(f"  {name}: {entry['runs']} run(s), CPU {entry['cpu_seconds']}s, wall {entry['wall_seconds']}s")
+    latencies = report["endpoint_to_transcript_seconds"]
+    if latencies:
+        print(f"  end of command to transcript: min {min(latencies)}s, max {max(latencies)}s "
+              f"over {len(latencies)} command(s)")
+    print(f"  memory growth: {report['rss_growth_mb_per_hour']} MB per recorded hour")
+    if not report["drained"]:
+        print("  ⚠️ Some consumer threads were still running when the report was taken.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the audio pipeline with a recorded WAV file.")
+    parser.add_argument("wav", help="16 kHz mono 16-bit WAV to replay")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="Replay speed; 0 replays as fast as possible. Above 1 the capture waits for "
+                             "the slowest consumer, so dropped frames are only meaningful at 1 or below")
+    parser.add_argument("--stt", default=None, help="Speech-to-text backend (defaults to STT_BACKEND)")
+    parser.add_argument("--wake-at", type=float, nargs="*", default=[],
+                        help="Offsets in seconds to fire the wake word when no Picovoice key is set")
+    parser.add_argument("--segment-seconds", type=float, default=None, help="Override SEGMENT_SECONDS")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.wav, speed=args.speed, stt=args.stt, wake_times=args.wake_at,
+                           segment_seconds=args.segment_seconds)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
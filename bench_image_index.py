@@ -0,0 +1,101 @@
+"""Recall-vs-latency benchmark of the compressed CLIP index against the exact one.
+
+Queries are stored library vectors with a little noise added, so no model is needed.
+Ground truth comes from the exact (flat) index; every nprobe setting of the IVF-PQ
+index is scored on recall@k and single-query latency:
+
+    python bench_image_index.py --nprobe 1 4 16 64 --k 10 --num-queries 500
+"""
+import argparse
+import glob
+import json
+import os
+import time
+
+import faiss
+import numpy as np
+
+from image_index import CLIP_INDEX_PATH, CLIP_IVFPQ_INDEX_PATH, read_faiss_index
+
+
+def index_size_mb(path):
+    size = os.path.getsize(path)
+    ivfdata = glob.glob(f"{path}*.ivfdata")
+    if ivfdata:
+        size += os.path.getsize(max(ivfdata, key=os.path.getmtime))  # The newest lists are the live ones
+    return size / 2**20
+
+
+def make_queries(exact, num_queries, noise, seed=0):
+    rng = np.random.default_rng(seed)
+    ids = rng.choice(exact.ntotal, size=min(num_queries, exact.ntotal), replace=False)
+    queries = np.vstack([exact.reconstruct(int(i)) for i in ids]).astype(np.float32)
+    queries += rng.normal(scale=noise, size=queries.shape).astype(np.float32)
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def timed_search(index, queries, k):
+    """Searches one query at a time, as the server does; returns (ids, per-query seconds)."""
+    ids, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        _, found = index.search(query[None, :], k)
+        latencies.append(time.perf_counter() - start)
+        ids.append(found[0])
+    return np.vstack(ids), np.array(latencies)
+
+
+def recall_at_k(found, truth):
+    return float(np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth)]))
+
+
+def summarize(name, found, latencies, truth, size_mb, **extra):
+    return dict(
+        name=name,
+        recall=round(recall_at_k(found, truth), 4),
+        mean_ms=round(latencies.mean() * 1000, 3),
+        p95_ms=round(float(np.percentile(latencies, 95)) * 1000, 3),
+        size_mb=round(size_mb, 1),
+        **extra,
+    )
+
+
+def run_benchmark(nprobes, k=10, num_queries=500, noise=0.05,
+                  exact_path=CLIP_INDEX_PATH, compressed_path=CLIP_IVFPQ_INDEX_PATH):
+    exact = faiss.read_index(exact_path)
+    compressed = read_faiss_index(compressed_path)
+    queries = make_queries(exact, num_queries, noise)
+
+    truth, exact_latencies = timed_search(exact, queries, k)
+    rows = [summarize("flat", truth, exact_latencies, truth, index_size_mb(exact_path))]
+
+    ivf = faiss.extract_index_ivf(compressed)
+    for nprobe in nprobes:
+        ivf.nprobe = nprobe
+        found, latencies = timed_search(compressed, queries, k)
+        rows.append(summarize("ivfpq", found, latencies, truth, index_size_mb(compressed_path), nprobe=nprobe))
+    return {"vectors": exact.ntotal, "k": k, "queries": len(queries), "results": rows}
+
+
+def print_report(report):
+    print(f"\n📊 CLIP index: {report['vectors']} vectors, recall@{report['k']} over {report['queries']} queries")
+    print(f"  {'index':<8}{'nprobe':>8}{'recall':>9}{'mean ms':>10}{'p95 ms':>9}{'size MB':>10}")
+    for row in report["results"]:
+        print(f"  {row['name']:<8}{row.get('nprobe', '-'):>8}{row['recall']:>9}"
+              f"{row['mean_ms']:>10}{row['p95_ms']:>9}{row['size_mb']:>10}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the IVF-PQ CLIP index with the exact index.")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--num-queries", type=int, default=500)
+    parser.add_argument("--noise", type=float, default=0.05, help="Gaussian noise added to query vectors")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.nprobe, k=args.k, num_queries=args.num_queries, noise=args.noise)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
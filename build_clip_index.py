@@ -0,0 +1,260 @@
+"""Builds a CLIP-space FAISS index over the pre-generated image library.
+
+Each image is downloaded (or read from disk) once, encoded with CLIP in batches across
+several worker processes, and stored as a normalized vector. At request time the
+pre-generated source is then ranked from these stored vectors, with no download, and
+its top-k matches compete with the other providers.
+
+    python build_clip_index.py                          # every URL in image_data.pkl
+    python build_clip_index.py --image-dir new_photos --url-prefix http://board/library/
+
+Runs are incremental: images already in the index are skipped and new vectors are
+appended. Pass --rebuild to start over.
+
+For very large libraries, add `--compressed` to also derive an IVF-PQ index from the
+exact one (`--on-disk` keeps its inverted lists in a separate mmap-ed file). Serve it
+with CLIP_INDEX_MODE=ivfpq and tune CLIP_INDEX_NPROBE using bench_image_index.py.
+On-disk lists are never modified in place: each run writes a new .ivfdata file and
+swaps the .faiss file over to it, since serving processes keep the old one mapped.
+"""
+import argparse
+import concurrent.futures
+import glob
+import math
+import multiprocessing
+import os
+import time
+
+import faiss
+import numpy as np
+
+from http_client import decode_image, fetch_bytes
+from image_index import (CLIP_INDEX_PATH, CLIP_IVFPQ_INDEX_PATH, CLIP_URLS_PATH, IMAGE_DATA_PATH,
+                         IMAGE_URLS_PATH, UrlTable, build_url_table)
+
+CLIP_DIMENSION = 512
+ADD_CHUNK = 100_000  # Vectors copied from the exact index per add() call
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp")
+
+_worker_model = None
+_worker_preprocess = None
+
+
+def _init_worker(torch_threads):
+    """Loads CLIP once per worker process."""
+    global _worker_model, _worker_preprocess
+    import torch
+    import model_registry
+
+    torch.set_num_threads(torch_threads)
+    _worker_model, _worker_preprocess = model_registry.get_clip_model()
+
+
+def _load_image(location):
+    try:
+        if location.startswith(("http://", "https://")):
+            content = fetch_bytes(location, timeout=10, retry=True)
+        else:
+            with open(location, "rb") as f:
+                content = f.read()
+        return decode_image(content)
+    except Exception as e:
+        print(f"❌ Skipping {location}: {e}")
+        return None
+
+
+def _encode_batch(batch):
+    """Encodes [(key, location)]; returns [(key, vector)] for the images that loaded."""
+    import torch
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=8) as executor:
+        images = list(executor.map(_load_image, [location for _, location in batch]))
+    loaded = [(key, image) for (key, _), image in zip(batch, images) if image is not None]
+    if not loaded:
+        return []
+
+    device = next(_worker_model.parameters()).device
+    with torch.inference_mode():
+        image_tensor = torch.stack([_worker_preprocess(image) for _, image in loaded]).to(device)
+        embeddings = _worker_model.encode_image(image_tensor).float()
+        embeddings = embeddings / embeddings.norm(dim=-1, keepdim=True)
+    return list(zip([key for key, _ in loaded], embeddings.cpu().numpy()))
+
+
+def list_sources(image_dir=None, url_prefix=None, data_path=IMAGE_DATA_PATH):
+    """Returns [(key, location)]: the stored URL and where to read the image from."""
+    if image_dir:
+        names = sorted(n for n in os.listdir(image_dir) if n.lower().endswith(IMAGE_EXTENSIONS))
+        return [((url_prefix + name) if url_prefix else os.path.join(image_dir, name), os.path.join(image_dir, name))
+                for name in names]
+
+    if not os.path.exists(IMAGE_URLS_PATH) or os.path.getmtime(IMAGE_URLS_PATH) < os.path.getmtime(data_path):
+        build_url_table(data_path, IMAGE_URLS_PATH)
+    urls = UrlTable(IMAGE_URLS_PATH)
+    return [(urls[i], urls[i]) for i in range(len(urls))]
+
+
+def new_index():
+    return faiss.IndexFlatIP(CLIP_DIMENSION)
+
+
+def save_index(index, urls, index_path=CLIP_INDEX_PATH, urls_path=CLIP_URLS_PATH):
+    """Writes both files via rename so a serving process never sees a partial file."""
+    tmp_path = f"{index_path}.tmp"
+    faiss.write_index(index, tmp_path)
+    os.replace(tmp_path, index_path)
+    UrlTable.write(urls_path, urls)
+
+
+def load_existing(index_path=CLIP_INDEX_PATH, urls_path=CLIP_URLS_PATH):
+    if not (os.path.exists(index_path) and os.path.exists(urls_path)):
+        return None, []
+    table = UrlTable(urls_path)
+    return faiss.read_index(index_path), [table[i] for i in range(len(table))]
+
+
+def build(sources, workers, batch_size=32, checkpoint_every=50, rebuild=False, index=None):
+    existing_index, urls = (None, []) if rebuild else load_existing()
+    if existing_index is not None:
+        index = existing_index
+    elif index is None:
+        index = new_index()
+
+    known = set(urls)
+    todo = [(key, location) for key, location in sources if key not in known]
+    print(f"🧮 {len(todo)} new images to encode ({len(urls)} already indexed)")
+    if not todo:
+        return index, urls
+
+    if not index.is_trained:
+        raise ValueError("The index needs training before vectors can be added.")
+
+    batches = [todo[i:i + batch_size] for i in range(0, len(todo), batch_size)]
+    torch_threads = max(1, (os.cpu_count() or 1) // workers)
+    ctx = multiprocessing.get_context("spawn")  # CUDA and torch threads don't survive fork
+    with ctx.Pool(workers, initializer=_init_worker, initargs=(torch_threads,)) as pool:
+        for done, encoded in enumerate(pool.imap(_encode_batch, batches), start=1):
+            if encoded:
+                index.add(np.vstack([vector for _, vector in encoded]).astype(np.float32))
+                urls.extend(key for key, _ in encoded)
+            if done % checkpoint_every == 0:
+                save_index(index, urls)
+                print(f"💾 Checkpoint: {len(urls)} vectors ({done}/{len(batches)} batches)")
+
+    save_index(index, urls)
+    print(f"✅ CLIP index holds {index.ntotal} vectors -> {CLIP_INDEX_PATH}")
+    return index, urls
+
+
+def default_nlist(num_vectors):
+    """Roughly 4 * sqrt(N) inverted lists, the usual starting point for IVF."""
+    return max(1, min(65536, int(4 * math.sqrt(num_vectors))))
+
+
+def uses_ondisk_lists(index):
+    ivf = faiss.extract_index_ivf(index)
+    return isinstance(faiss.downcast_InvertedLists(ivf.invlists), faiss.OnDiskInvertedLists)
+
+
+def remove_stale_ivfdata(index_path, keep):
+    """Deletes earlier .ivfdata files; one still mapped by a server on Windows is left for the next run."""
+    for path in glob.glob(f"{index_path}*.ivfdata"):
+        if os.path.abspath(path) != os.path.abspath(keep):
+            try:
+                os.remove(path)
+            except OSError as e:
+                print(f"⚠️ Could not remove {path} yet: {e}")
+
+
+def write_index_atomic(index, path):
+    tmp_path = f"{path}.tmp"
+    faiss.write_index(index, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def build_compressed(nlist=None, pq_m=64, pq_bits=8, on_disk=False, retrain=False,
+                     index_path=CLIP_IVFPQ_INDEX_PATH, exact_path=CLIP_INDEX_PATH):
+    """Derives an IVF-PQ index from the exact CLIP index, appending only vectors it lacks.
+
+    Row ids stay aligned with clip_image_urls.bin, so both indexes share one URL table.
+    In-memory lists are appended to. On-disk lists are rebuilt into a fresh .ivfdata
+    file from the empty trained index kept in `<index_path>.trained`.
+    """
+    exact = faiss.read_index(exact_path)
+    total = exact.ntotal
+    trained_path = f"{index_path}.trained"
+
+    index = None
+    if os.path.exists(index_path) and not retrain:
+        index = faiss.read_index(index_path)
+        if (on_disk or uses_ondisk_lists(index)) and not os.path.exists(trained_path):
+            print("⚠️ No trained template next to the index; retraining")
+            index = None
+    if index is None or index.ntotal > total:
+        nlist = nlist or default_nlist(total)
+        # FAISS wants ~39 training points per centroid, and 2^bits per PQ sub-quantizer.
+        train_size = min(total, max(nlist * 39, 2 ** pq_bits * 39, 50_000))
+        if total < max(nlist, 2 ** pq_bits):
+            raise ValueError(f"{total} vectors are too few to train nlist={nlist}, pq_bits={pq_bits}.")
+        print(f"🏋️ Training IVF{nlist},PQ{pq_m}x{pq_bits} on {train_size} of {total} vectors")
+        sample = np.sort(np.random.default_rng(0).choice(total, size=train_size, replace=False))
+        training = np.vstack([exact.reconstruct(int(i)) for i in sample]).astype(np.float32)
+        quantizer = faiss.IndexFlatIP(CLIP_DIMENSION)
+        index = faiss.IndexIVFPQ(quantizer, CLIP_DIMENSION, nlist, pq_m, pq_bits, faiss.METRIC_INNER_PRODUCT)
+        index.train(training)
+        write_index_atomic(index, trained_path)
+
+    start = index.ntotal
+    ivfdata_path = None
+    if on_disk or uses_ondisk_lists(index):
+        # Appending to loaded on-disk lists would write into the file servers have mapped,
+        # so every list is rebuilt from the empty template
+        index, start = faiss.read_index(trained_path), 0
+    if on_disk:
+        # Populate a scratch copy, then move its lists into a new standalone .ivfdata file.
+        from faiss.contrib.ondisk import merge_ondisk
+
+        block_path = f"{index_path}.block"
+        block = faiss.clone_index(index)
+        for i in range(0, total, ADD_CHUNK):
+            block.add(exact.reconstruct_n(i, min(ADD_CHUNK, total - i)))
+        faiss.write_index(block, block_path)
+        ivfdata_path = f"{index_path}.{time.strftime('%Y%m%d%H%M%S')}.ivfdata"
+        merge_ondisk(index, [block_path], ivfdata_path)
+        os.remove(block_path)
+    else:
+        for i in range(start, total, ADD_CHUNK):
+            index.add(exact.reconstruct_n(i, min(ADD_CHUNK, total - i)))
+
+    # The .faiss file names its .ivfdata, so this rename swaps both at once
+    write_index_atomic(index, index_path)
+    remove_stale_ivfdata(index_path, keep=ivfdata_path or "")
+    print(f"✅ Compressed index holds {index.ntotal} vectors ({total - start} added) -> {index_path}")
+    return index
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Precompute CLIP embeddings for the image library.")
+    parser.add_argument("--data", default=IMAGE_DATA_PATH, help="Pickled DataFrame with photo_image_url")
+    parser.add_argument("--image-dir", help="Index a directory of images instead of the DataFrame")
+    parser.add_argument("--url-prefix", help="URL under which --image-dir files are served")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--checkpoint-every", type=int, default=50, help="Save every N batches")
+    parser.add_argument("--rebuild", action="store_true", help="Ignore the existing index")
+    parser.add_argument("--compressed", action="store_true", help="Also build the IVF-PQ index")
+    parser.add_argument("--nlist", type=int, help="IVF lists (default ~4*sqrt(N))")
+    parser.add_argument("--pq-m", type=int, default=64, help="PQ sub-quantizers; must divide 512")
+    parser.add_argument("--pq-bits", type=int, default=8, help="Bits per PQ code")
+    parser.add_argument("--on-disk", action="store_true", help="Store IVF lists in a separate .ivfdata file")
+    parser.add_argument("--retrain", action="store_true", help="Retrain the IVF-PQ index from scratch")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    build(list_sources(args.image_dir, args.url_prefix, args.data), args.workers,
+          batch_size=args.batch_size, checkpoint_every=args.checkpoint_every, rebuild=args.rebuild)
+    if args.compressed:
+        build_compressed(nlist=args.nlist, pq_m=args.pq_m, pq_bits=args.pq_bits,
+                         on_disk=args.on_disk, retrain=args.retrain or args.rebuild)
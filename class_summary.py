@@ -1,7 +1,8 @@
 import google.generativeai as genaia
-from quiz_generator import QuizGenerator
 from dotenv import load_dotenv
-import os
+import os, threading, concurrent.futures
+from datetime import datetime
+from transcripts import TRANSCRIPT_DB, connect, estimate_tokens, window_conditions
 
 load_dotenv()
 
@@ -9,24 +10,282 @@ GEMINI_API_KEY= os.getenv("GEMINI_API_KEY")
 
 genaia.configure(api_key=GEMINI_API_KEY)
 
-def summarize_class():
-    """Summarizes the entire class based on recorded transcriptions."""
-    quiz_generator = QuizGenerator()
-    text = quiz_generator.get_text_transcriptions()
-    prompt = f"""
+SEGMENT_TOKENS = 2000  # Transcript tokens summarized together in the map step
+REDUCE_FANOUT = 8  # Partial summaries combined per reduce call
+MAP_WORKERS = 4
+
+# Serializes cache updates so concurrent requests don't summarize the same segment twice
+_summary_lock = threading.Lock()
+
+SEGMENT_PROMPT = """
+    Summarize this part of a class discussion into short key points, keeping every topic mentioned:
+
+    {text}
+    """
+
+REDUCE_PROMPT = """
+    Combine these partial summaries of consecutive parts of a class into one list of key points,
+    merging repeated topics:
+
+    {text}
+    """
+
+FINAL_PROMPT = """
     Summarize the following class discussion into key points:
-    
+
     {text}
-    
+
     - Keep the summary concise and give in only few points not more than four.
     - Highlight key topics covered.
     - If no text transcription present then return 'None' without any explaination.
     """
 
+
+def ensure_summary_table(conn):
+    """Partial summaries keyed by the text_recording id range they cover.
+
+    kind is 'segment' (map step), 'window' (map step of a time-windowed request), 'group'
+    (intermediate reduce) or 'final'. closed is 0 for anything covering the still-growing
+    last segment or a window piece; those rows are dropped on the next full update.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS class_summary_parts (
+            scope TEXT,
+            kind TEXT,
+            level INTEGER,
+            start_id INTEGER,
+            end_id INTEGER,
+            closed INTEGER,
+            summary TEXT,
+            created TEXT,
+            PRIMARY KEY (scope, kind, level, start_id, end_id)
+        )
+    """)
+
+
+def generate(prompt):
     model = genaia.GenerativeModel('gemini-2.0-flash')
     response = model.generate_content(prompt)
-    if response.text:
-        return response.text
-    else:
-        return "No summary available."
-    
\ No newline at end of file
+    return response.text.strip() if response.text else ""
+
+
+def _split_segments(rows):
+    """Groups (id, text) rows into ~SEGMENT_TOKENS segments; returns (closed, open_tail)."""
+    segments, current, tokens = [], [], 0
+    for row in rows:
+        current.append(row)
+        tokens += estimate_tokens(row[1] or "")
+        if tokens >= SEGMENT_TOKENS:
+            segments.append(current)
+            current, tokens = [], 0
+    return segments, current
+
+
+def _summarize_segments(segments):
+    """Map step: one model call per segment of (id, text) rows, run in parallel."""
+    if not segments:
+        return []
+    print(f"🧩 Summarizing {len(segments)} new transcript segment(s)")
+    with concurrent.futures.ThreadPoolExecutor(max_workers=MAP_WORKERS) as executor:
+        return list(executor.map(
+            lambda segment: generate(SEGMENT_PROMPT.format(text="\n".join(row[1] for row in segment))),
+            segments))
+
+
+def update_segments(scope, session=None, db_file=TRANSCRIPT_DB):
+    """Summarizes transcript rows added since the last call; returns every segment of the scope.
+
+    Returns [(start_id, end_id, closed, summary)] in order. Only new full segments and the
+    open tail cost a model call; earlier segments come from class_summary_parts.
+    """
+    conn = connect(db_file)
+    ensure_summary_table(conn)
+    parts = conn.execute(
+        "SELECT start_id, end_id, closed, summary FROM class_summary_parts "
+        "WHERE scope = ? AND kind = 'segment' AND closed = 1 ORDER BY start_id", (scope,)
+    ).fetchall()
+    last_end = parts[-1][1] if parts else 0
+
+    conditions, params = window_conditions(session=session)
+    where = "".join(f" AND {condition}" for condition in conditions)
+    rows = conn.execute(f"SELECT id, text FROM text_recording WHERE id > ?{where} ORDER BY id",
+                        [last_end] + params).fetchall()
+    new_segments, tail = _split_segments(rows)
+
+    tail_part = None
+    if tail:
+        cached = conn.execute(
+            "SELECT summary FROM class_summary_parts WHERE scope = ? AND kind = 'segment' AND level = 0 "
+            "AND start_id = ? AND end_id = ?", (scope, tail[0][0], tail[-1][0])
+        ).fetchone()
+        if cached:
+            tail_part = (tail[0][0], tail[-1][0], 0, cached[0])
+        else:
+            new_segments.append(tail)
+
+    if new_segments:
+        summaries = _summarize_segments(new_segments)
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        for segment, summary in zip(new_segments, summaries):
+            closed = 0 if segment is tail else 1
+            conn.execute("INSERT OR REPLACE INTO class_summary_parts VALUES (?, 'segment', 0, ?, ?, ?, ?, ?)",
+                         (scope, segment[0][0], segment[-1][0], closed, summary, now))
+            if closed:
+                parts.append((segment[0][0], segment[-1][0], 1, summary))
+            else:
+                tail_part = (segment[0][0], segment[-1][0], 0, summary)
+
+    if tail_part:
+        parts.append(tail_part)
+    # Open rows (earlier versions of the tail, window pieces) are obsolete
+    conn.execute("DELETE FROM class_summary_parts WHERE scope = ? AND closed = 0 AND end_id != ?",
+                 (scope, tail_part[1] if tail_part else -1))
+    conn.commit()
+    conn.close()
+    return parts
+
+
+def _cached_reduce(conn, scope, kind, level, parts, prompt):
+    """Summary of `parts` under `prompt`, from the cache or one model call."""
+    start_id, end_id = parts[0][0], parts[-1][1]
+    closed = int(all(part[2] for part in parts))
+    row = conn.execute(
+        "SELECT summary FROM class_summary_parts WHERE scope = ? AND kind = ? AND level = ? AND start_id = ? AND end_id = ?",
+        (scope, kind, level, start_id, end_id)
+    ).fetchone()
+    if row:
+        return (start_id, end_id, closed, row[0])
+    summary = generate(prompt.format(text="\n\n".join(part[3] for part in parts)))
+    conn.execute("INSERT OR REPLACE INTO class_summary_parts VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                 (scope, kind, level, start_id, end_id, closed, summary,
+                  datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+    conn.commit()
+    return (start_id, end_id, closed, summary)
+
+
+def reduce_parts(scope, parts, db_file=TRANSCRIPT_DB):
+    """Combines partial summaries REDUCE_FANOUT at a time until one final prompt's worth is left."""
+    conn = connect(db_file)
+    ensure_summary_table(conn)
+    level = 1
+    while len(parts) > REDUCE_FANOUT:
+        parts = [_cached_reduce(conn, scope, "group", level, parts[i:i + REDUCE_FANOUT], REDUCE_PROMPT)
+                 for i in range(0, len(parts), REDUCE_FANOUT)]
+        level += 1
+    conn.close()
+    return parts
+
+
+def window_segments(scope, session=None, since=None, until=None, last_minutes=None, db_file=TRANSCRIPT_DB):
+    """Partial summaries of just the rows in a time window, as [(start_id, end_id, closed, summary)].
+
+    Closed segments of the scope that lie inside the window come from the cache. The rows
+    around them are summarized as 'window' pieces, cached by id range. Nothing outside
+    the window is summarized, and the rest of the history is not caught up.
+    """
+    conn = connect(db_file)
+    ensure_summary_table(conn)
+    conditions, params = window_conditions(session, since, until, last_minutes)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    rows = conn.execute(f"SELECT id, text FROM text_recording {where} ORDER BY id", params).fetchall()
+    if not rows:
+        conn.close()
+        return []
+
+    parts = conn.execute(
+        "SELECT start_id, end_id, closed, summary FROM class_summary_parts WHERE scope = ? AND kind = 'segment' "
+        "AND closed = 1 AND start_id >= ? AND end_id <= ? ORDER BY start_id", (scope, rows[0][0], rows[-1][0])
+    ).fetchall()
+
+    # Runs of window rows that no cached segment covers
+    runs, current, next_part = [], [], 0
+    for row in rows:
+        while next_part < len(parts) and parts[next_part][1] < row[0]:
+            next_part += 1
+        if next_part < len(parts) and parts[next_part][0] <= row[0]:
+            if current:
+                runs.append(current)
+                current = []
+        else:
+            current.append(row)
+    if current:
+        runs.append(current)
+
+    missing = []
+    for run in runs:
+        segments, tail = _split_segments(run)
+        for piece in segments + ([tail] if tail else []):
+            cached = conn.execute(
+                "SELECT summary FROM class_summary_parts WHERE scope = ? AND kind = 'window' AND level = 0 "
+                "AND start_id = ? AND end_id = ?", (scope, piece[0][0], piece[-1][0])
+            ).fetchone()
+            if cached:
+                parts.append((piece[0][0], piece[-1][0], 0, cached[0]))
+            else:
+                missing.append(piece)
+
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    for piece, summary in zip(missing, _summarize_segments(missing)):
+        conn.execute("INSERT OR REPLACE INTO class_summary_parts VALUES (?, 'window', 0, ?, ?, 0, ?, ?)",
+                     (scope, piece[0][0], piece[-1][0], summary, now))
+        parts.append((piece[0][0], piece[-1][0], 0, summary))
+    conn.commit()
+    conn.close()
+    return sorted(parts)
+
+
+def prepare_summary(session=None, since=None, until=None, last_minutes=None, db_file=TRANSCRIPT_DB):
+    """Brings the cached partial summaries up to date; returns (scope, parts for the final prompt)."""
+    scope = f"session:{session}" if session else "all"
+    with _summary_lock:
+        if since or until or last_minutes is not None:
+            parts = window_segments(scope, session, since, until, last_minutes, db_file)
+        else:
+            parts = update_segments(scope, session, db_file)
+        return scope, reduce_parts(scope, parts, db_file) if parts else []
+
+
+def summarize_class(**window):
+    """Summarizes the class based on recorded transcriptions.
+
+    Each transcript segment is summarized once and cached in class_summary_parts, so a
+    call only pays for segments added since the last one. `window` (session, since,
+    until, last_minutes) limits the summary to part of the class history.
+    """
+    scope, parts = prepare_summary(**window)
+    if not parts:
+        return "None"
+    conn = connect(TRANSCRIPT_DB)
+    ensure_summary_table(conn)
+    final = _cached_reduce(conn, scope, "final", 0, parts, FINAL_PROMPT)
+    conn.close()
+    return final[3] or "No summary available."
+
+def summarize_class_stream(**window):
+    """Like summarize_class, but streams the final reduce step as Gemini produces it."""
+    scope, parts = prepare_summary(**window)
+    if not parts:
+        yield "None"
+        return
+    conn = connect(TRANSCRIPT_DB)
+    ensure_summary_table(conn)
+    start_id, end_id, closed = parts[0][0], parts[-1][1], int(all(part[2] for part in parts))
+    row = conn.execute(
+        "SELECT summary FROM class_summary_parts WHERE scope = ? AND kind = 'final' AND level = 0 AND start_id = ? AND end_id = ?",
+        (scope, start_id, end_id)
+    ).fetchone()
+    if row:
+        conn.close()
+        yield row[0]
+        return
+
+    model = genaia.GenerativeModel('gemini-2.0-flash')
+    pieces = []
+    for chunk in model.generate_content(FINAL_PROMPT.format(text="\n\n".join(part[3] for part in parts)), stream=True):
+        if chunk.text:
+            pieces.append(chunk.text)
+            yield chunk.text
+    conn.execute("INSERT OR REPLACE INTO class_summary_parts VALUES (?, 'final', 0, ?, ?, ?, ?, ?)",
+                 (scope, start_id, end_id, closed, "".join(pieces).strip(), datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+    conn.commit()
+    conn.close()
@@ -0,0 +1,93 @@
+import os
+import sqlite3
+import time
+
+import numpy as np
+
+EMBEDDING_CACHE_DB = "clip_embeddings.db"
+EMBEDDING_CACHE_MAX_MB = float(os.getenv("EMBEDDING_CACHE_MAX_MB", "256"))
+
+
+class EmbeddingCache:
+    """On-disk cache of normalized CLIP image embeddings.
+
+    Entries are keyed by image URL and also indexed by a hash of the downloaded bytes,
+    so the same picture served from a new URL is recognised without another forward
+    pass. Least recently used entries are evicted once the stored vectors exceed
+    `max_mb`.
+    """
+
+    def __init__(self, db_file=EMBEDDING_CACHE_DB, max_mb=EMBEDDING_CACHE_MAX_MB):
+        self.db_file = db_file
+        self.max_bytes = int(max_mb * 2**20)
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS image_embeddings (
+                url TEXT PRIMARY KEY,
+                content_hash TEXT,
+                embedding BLOB,
+                last_used REAL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_image_embeddings_hash ON image_embeddings (content_hash)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_image_embeddings_last_used ON image_embeddings (last_used)")
+        conn.commit()
+        conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_file, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def get_many(self, urls):
+        """Returns {url: embedding} for the URLs already cached."""
+        if not urls:
+            return {}
+        conn = self._connect()
+        placeholders = ",".join("?" * len(urls))
+        rows = conn.execute(
+            f"SELECT url, embedding FROM image_embeddings WHERE url IN ({placeholders})", list(urls)
+        ).fetchall()
+        if rows:
+            conn.executemany("UPDATE image_embeddings SET last_used = ? WHERE url = ?",
+                             [(time.time(), url) for url, _ in rows])
+            conn.commit()
+        conn.close()
+        return {url: np.frombuffer(blob, dtype=np.float32) for url, blob in rows}
+
+    def get_by_hash(self, content_hash):
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT embedding FROM image_embeddings WHERE content_hash = ? LIMIT 1", (content_hash,)
+        ).fetchone()
+        conn.close()
+        return np.frombuffer(row[0], dtype=np.float32) if row else None
+
+    def put_many(self, entries):
+        """Stores [(url, content_hash, embedding)] and evicts down to the size cap."""
+        if not entries:
+            return
+        now = time.time()
+        conn = self._connect()
+        conn.executemany(
+            "INSERT OR REPLACE INTO image_embeddings (url, content_hash, embedding, last_used) VALUES (?, ?, ?, ?)",
+            [(url, content_hash, np.asarray(embedding, dtype=np.float32).tobytes(), now)
+             for url, content_hash, embedding in entries]
+        )
+        self._evict(conn)
+        conn.commit()
+        conn.close()
+
+    def _evict(self, conn):
+        count, total_bytes = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(embedding)), 0) FROM image_embeddings"
+        ).fetchone()
+        if total_bytes <= self.max_bytes or not count:
+            return
+        # Embeddings share one size, so trim by count from the oldest end.
+        excess = count - int(self.max_bytes // (total_bytes / count))
+        conn.execute("""
+            DELETE FROM image_embeddings WHERE url IN (
+                SELECT url FROM image_embeddings ORDER BY last_used ASC LIMIT ?
+            )
+        """, (excess,))
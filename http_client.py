@@ -0,0 +1,103 @@
+"""Shared HTTP session and bounded image downloads.
+
+Every outbound call goes through one pooled `requests.Session`, so repeated calls to
+the same host reuse a kept-alive TCP/TLS connection. Idempotent requests are retried
+with backoff. Image downloads use a second pool without retries, so their timeout is
+their whole cost; they are streamed and abandoned past `max_bytes` or `timeout`. Images are
+decoded straight to roughly CLIP input size: PIL's draft mode lets JPEGs be decoded
+at a fraction of their full resolution.
+"""
+import os
+import threading
+import time
+from io import BytesIO
+
+import requests
+from PIL import Image
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+MAX_IMAGE_BYTES = int(os.getenv("MAX_IMAGE_BYTES", str(10 * 2**20)))
+IMAGE_DECODE_SIZE = 224  # CLIP's input resolution
+DOWNLOAD_CHUNK_BYTES = 16 * 1024  # Small enough that the overall timeout is checked often
+POOL_MAXSIZE = 32  # Connections kept per host; the provider pool runs 16 threads
+
+_session = None
+_image_session = None
+_session_lock = threading.Lock()
+
+
+class DownloadTooLarge(Exception):
+    pass
+
+
+def _build_session(retry):
+    adapter = HTTPAdapter(pool_connections=16, pool_maxsize=POOL_MAXSIZE, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["User-Agent"] = "smartboard/1.0"
+    return session
+
+
+def get_session():
+    """Process-wide pooled session with keep-alive and retries on transient failures."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session(Retry(total=2, connect=2, read=1, backoff_factor=0.2,
+                                                status_forcelist=(429, 500, 502, 503, 504),
+                                                allowed_methods=("GET", "HEAD")))
+    return _session
+
+
+def get_image_session():
+    """Process-wide pooled session for image downloads, with retries off."""
+    global _image_session
+    if _image_session is None:
+        with _session_lock:
+            if _image_session is None:
+                _image_session = _build_session(Retry(0, read=False))
+    return _image_session
+
+
+def fetch_bytes(url, timeout=5, max_bytes=MAX_IMAGE_BYTES, retry=False):
+    """Streams the response body within `timeout` seconds in total.
+
+    Raises DownloadTooLarge once the body passes `max_bytes` and requests' Timeout once
+    `timeout` has passed. `retry` uses the retrying session, for offline jobs.
+    """
+    deadline = time.monotonic() + timeout
+    session = get_session() if retry else get_image_session()
+    with session.get(url, timeout=timeout, stream=True) as response:
+        response.raise_for_status()
+        declared = response.headers.get("Content-Length")
+        if declared and declared.isdigit() and int(declared) > max_bytes:
+            raise DownloadTooLarge(f"{url} is {declared} bytes (limit {max_bytes})")
+
+        buffer = bytearray()
+        for chunk in response.iter_content(DOWNLOAD_CHUNK_BYTES):
+            buffer += chunk
+            if len(buffer) > max_bytes:
+                raise DownloadTooLarge(f"{url} exceeds {max_bytes} bytes")
+            if time.monotonic() > deadline:
+                raise requests.exceptions.Timeout(f"{url} took longer than {timeout}s")
+        return bytes(buffer)
+
+
+def decode_image(content, size=IMAGE_DECODE_SIZE):
+    """Decodes image bytes to RGB with the shorter side reduced to about `size` pixels.
+
+    CLIP resizes the shorter side to 224 and center-crops, so nothing it sees is lost.
+    """
+    image = Image.open(BytesIO(content))
+    width, height = image.size
+    scale = size / min(width, height)
+    if scale < 1:
+        box = (max(size, round(width * scale)), max(size, round(height * scale)))
+        image.draft("RGB", box)  # JPEG: decode at 1/2, 1/4 or 1/8 scale directly
+        image = image.convert("RGB")
+        image.thumbnail(box, Image.BICUBIC)
+        return image
+    return image.convert("RGB")
@@ -0,0 +1,211 @@
+"""Resident FAISS index over the pre-generated image library.
+
+The index is loaded once (memory-mapped where FAISS supports it) and the image URLs are
+kept in a compact memory-mapped table instead of the pickled pandas frame. When the
+files on disk change, a fresh snapshot is loaded and swapped in atomically; searches
+already running keep the snapshot they started with.
+
+Run `python image_index.py` to (re)build image_urls.bin from image_data.pkl.
+"""
+import glob
+import mmap
+import os
+import struct
+import threading
+import time
+
+import faiss
+import numpy as np
+
+IMAGE_INDEX_PATH = "faiss_index.bin"
+IMAGE_DATA_PATH = "image_data.pkl"
+IMAGE_URLS_PATH = "image_urls.bin"
+CLIP_INDEX_PATH = "clip_image_index.faiss"  # Built by build_clip_index.py
+CLIP_URLS_PATH = "clip_image_urls.bin"
+CLIP_IVFPQ_INDEX_PATH = "clip_image_index.ivfpq.faiss"  # build_clip_index.py --compressed
+CLIP_INDEX_MODE = os.getenv("CLIP_INDEX_MODE", "flat")  # "flat" (exact) or "ivfpq"
+CLIP_INDEX_NPROBE = int(os.getenv("CLIP_INDEX_NPROBE", "16"))
+URL_COLUMN = "photo_image_url"
+RELOAD_CHECK_SECONDS = 5
+
+_URL_TABLE_MAGIC = b"URLT0001"
+_HEADER = struct.Struct("<8sQ")
+
+
+class UrlTable:
+    """Read-only, memory-mapped list of strings.
+
+    Layout: magic, count, (count + 1) little-endian uint64 offsets, then the UTF-8 blob.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count = _HEADER.unpack_from(self._mmap, 0)
+        if magic != _URL_TABLE_MAGIC:
+            raise ValueError(f"{path} is not a URL table.")
+        self._offsets = np.frombuffer(self._mmap, dtype="<u8", count=count + 1, offset=_HEADER.size)
+        self._blob_start = _HEADER.size + 8 * (count + 1)
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        start = self._blob_start + int(self._offsets[i])
+        end = self._blob_start + int(self._offsets[i + 1])
+        return self._mmap[start:end].decode("utf-8")
+
+    @staticmethod
+    def write(path, strings):
+        """Writes the table next to `path` and renames it into place."""
+        encoded = [s.encode("utf-8") for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype="<u8")
+        np.cumsum([len(e) for e in encoded], out=offsets[1:])
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(_HEADER.pack(_URL_TABLE_MAGIC, len(encoded)))
+            f.write(offsets.tobytes())
+            for e in encoded:
+                f.write(e)
+        os.replace(tmp_path, path)
+
+
+def build_url_table(data_path=IMAGE_DATA_PATH, urls_path=IMAGE_URLS_PATH, column=URL_COLUMN):
+    """Extracts the URL column from the pickled DataFrame (needs pandas, once)."""
+    import pickle
+
+    with open(data_path, "rb") as f:
+        df = pickle.load(f)
+    UrlTable.write(urls_path, df[column].astype(str).tolist())
+    print(f"✅ Wrote {len(df)} image URLs to {urls_path}")
+
+
+def read_faiss_index(path):
+    """Memory-maps the index when its type allows it, otherwise reads it into RAM."""
+    if glob.glob(f"{path}*.ivfdata"):
+        # On-disk inverted lists map their own .ivfdata file; IO_FLAG_MMAP on top crashes searches
+        return faiss.read_index(path, faiss.IO_FLAG_READ_ONLY)
+    try:
+        return faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    except RuntimeError:
+        return faiss.read_index(path)
+
+
+def _mtime(path):
+    if path is None:
+        return None
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+class _Snapshot:
+    def __init__(self, index, urls, signature):
+        self.index = index
+        self.urls = urls
+        self.signature = signature
+
+
+class ImageIndex:
+    """Keeps the image index and URL table resident and reloads them when they change."""
+
+    def __init__(self, index_path=IMAGE_INDEX_PATH, urls_path=IMAGE_URLS_PATH, data_path=IMAGE_DATA_PATH,
+                 nprobe=None):
+        """`data_path` is the pickled DataFrame the URL table is derived from, or None.
+        `nprobe` sets how many inverted lists an IVF index scans per query."""
+        self.index_path = index_path
+        self.urls_path = urls_path
+        self.data_path = data_path
+        self.nprobe = nprobe
+        self._snapshot = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    def _signature(self):
+        return _mtime(self.index_path), _mtime(self.urls_path), _mtime(self.data_path)
+
+    def _load(self):
+        data_mtime = _mtime(self.data_path)
+        urls_mtime = _mtime(self.urls_path)
+        if data_mtime is not None and (urls_mtime is None or urls_mtime < data_mtime):
+            build_url_table(self.data_path, self.urls_path)
+
+        signature = self._signature()
+        index = read_faiss_index(self.index_path)
+        if self.nprobe:
+            try:
+                faiss.extract_index_ivf(index).nprobe = self.nprobe
+            except RuntimeError:
+                pass  # Not an IVF index
+        snapshot = _Snapshot(index, UrlTable(self.urls_path), signature)
+        print(f"📚 Image index loaded: {snapshot.index.ntotal} vectors, {len(snapshot.urls)} URLs")
+        return snapshot
+
+    def snapshot(self):
+        """Returns the current snapshot, reloading first if the files changed."""
+        now = time.monotonic()
+        if self._snapshot is not None and now - self._last_check < RELOAD_CHECK_SECONDS:
+            return self._snapshot
+
+        with self._lock:
+            if self._snapshot is None or now - self._last_check >= RELOAD_CHECK_SECONDS:
+                self._last_check = now
+                if self._snapshot is None or self._snapshot.signature != self._signature():
+                    # Build the new snapshot fully before swapping the reference.
+                    self._snapshot = self._load()
+        return self._snapshot
+
+    def available(self):
+        return os.path.exists(self.index_path) and os.path.exists(self.urls_path)
+
+    def search(self, query_vectors, k=1):
+        """Returns [(url, distance), ...] for the first query vector."""
+        return [(url, distance) for url, distance, _ in self.search_with_vectors(query_vectors, k, False)]
+
+    def search_with_vectors(self, query_vectors, k=1, reconstruct=True):
+        """Returns [(url, distance, stored_vector or None), ...] for the first query vector."""
+        snapshot = self.snapshot()
+        query_vectors = np.asarray(query_vectors, dtype=np.float32)
+        if reconstruct:
+            distances, indices, vectors = snapshot.index.search_and_reconstruct(query_vectors, k)
+        else:
+            distances, indices = snapshot.index.search(query_vectors, k)
+            vectors = [[None] * k]
+        # The index file can briefly be ahead of the URL table while a build is being saved.
+        return [(snapshot.urls[int(i)], float(d), v) for d, i, v in zip(distances[0], indices[0], vectors[0])
+                if 0 <= i < len(snapshot.urls)]
+
+
+_image_index = None
+_clip_image_index = None
+_image_index_lock = threading.Lock()
+
+
+def get_image_index():
+    """Process-wide ImageIndex over MiniLM caption vectors."""
+    global _image_index
+    if _image_index is None:
+        with _image_index_lock:
+            if _image_index is None:
+                _image_index = ImageIndex()
+    return _image_index
+
+
+def get_clip_image_index():
+    """Process-wide ImageIndex over CLIP image vectors (see build_clip_index.py)."""
+    global _clip_image_index
+    if _clip_image_index is None:
+        with _image_index_lock:
+            if _clip_image_index is None:
+                index_path = CLIP_IVFPQ_INDEX_PATH if CLIP_INDEX_MODE == "ivfpq" else CLIP_INDEX_PATH
+                _clip_image_index = ImageIndex(index_path, CLIP_URLS_PATH, data_path=None, nprobe=CLIP_INDEX_NPROBE)
+    return _clip_image_index
+
+
+if __name__ == "__main__":
+    build_url_table()
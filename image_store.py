@@ -0,0 +1,93 @@
+"""Content-addressed store for the images the smartboard displays.
+
+Chosen and generated images are resized once, re-encoded as WebP (JPEG if Pillow was
+built without WebP) and written under the SHA-256 of their original bytes. A file's
+name therefore never changes meaning, so main.py serves it with a strong ETag and a
+long immutable cache lifetime, and the board loads it over the LAN.
+"""
+import hashlib
+import os
+import re
+import threading
+from io import BytesIO
+
+from PIL import Image, features
+
+IMAGE_STORE_DIR = "image_store"
+IMAGE_STORE_URL_PREFIX = "/images/"
+IMAGE_STORE_MAX_SIDE = int(os.getenv("IMAGE_STORE_MAX_SIDE", "1280"))  # Enough for a board-sized display
+IMAGE_STORE_QUALITY = 85
+
+_NAME_PATTERN = re.compile(r"^([0-9a-f]{64})\.(webp|jpg)$")
+
+
+class ImageStore:
+    def __init__(self, root=IMAGE_STORE_DIR, max_side=IMAGE_STORE_MAX_SIDE, quality=IMAGE_STORE_QUALITY):
+        self.root = os.path.abspath(root)
+        self.max_side = max_side
+        self.quality = quality
+        self.extension = "webp" if features.check("webp") else "jpg"
+        os.makedirs(self.root, exist_ok=True)
+
+    def path_for(self, digest, extension=None):
+        return os.path.join(self.root, digest[:2], f"{digest}.{extension or self.extension}")
+
+    def url_for(self, digest):
+        return f"{IMAGE_STORE_URL_PREFIX}{digest}.{self.extension}"
+
+    def has(self, digest):
+        return os.path.exists(self.path_for(digest))
+
+    def is_local(self, url):
+        return bool(url) and url.startswith(IMAGE_STORE_URL_PREFIX)
+
+    def resolve(self, name):
+        """Maps a served file name to its path, or None if it is malformed or missing."""
+        match = _NAME_PATTERN.match(name)
+        if not match:
+            return None
+        path = self.path_for(match.group(1), match.group(2))
+        return path if os.path.exists(path) else None
+
+    def read(self, url):
+        path = self.resolve(url[len(IMAGE_STORE_URL_PREFIX):])
+        if path is None:
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+
+    def put(self, content):
+        """Stores image bytes (if not already present) and returns their local URL."""
+        digest = hashlib.sha256(content).hexdigest()
+        path = self.path_for(digest)
+        if os.path.exists(path):
+            return self.url_for(digest)
+
+        image = Image.open(BytesIO(content))
+        image.draft("RGB", (self.max_side, self.max_side))
+        keep_alpha = self.extension == "webp" and (image.mode in ("RGBA", "LA") or "transparency" in image.info)
+        image = image.convert("RGBA" if keep_alpha else "RGB")
+        image.thumbnail((self.max_side, self.max_side), Image.LANCZOS)
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        if self.extension == "webp":
+            image.save(tmp_path, format="WEBP", quality=self.quality, method=4)
+        else:
+            image.save(tmp_path, format="JPEG", quality=self.quality, optimize=True, progressive=True)
+        os.replace(tmp_path, path)  # Concurrent writers of the same digest produce identical files
+        return self.url_for(digest)
+
+
+_image_store = None
+_image_store_lock = threading.Lock()
+
+
+def get_image_store():
+    """Process-wide ImageStore."""
+    global _image_store
+    if _image_store is None:
+        with _image_store_lock:
+            if _image_store is None:
+                _image_store = ImageStore()
+    return _image_store
@@ -1,16 +1,32 @@
-from flask import Flask, request, jsonify, render_template
-import threading, os
-import wave, sqlite3, pyaudio, pvporcupine
+from flask import Flask, request, jsonify, render_template, send_file, abort, Response, stream_with_context
+import threading, os, time, uuid, json
+from collections import OrderedDict
+import sqlite3, pyaudio, pvporcupine
 from datetime import datetime
-import speech_recognition as sr
 
-from pdf_summary import PDFSummarizer
+from pdf_summary import get_pdf_summarizer
 from quiz_generator import QuizGenerator
+from quiz_intent import intent_stats, classify_by_rules, INTENT_CONFIDENCE_THRESHOLD
+from precompute import get_precomputed, start_precompute_worker
 from visual_generator import VisualGenerator
-from class_summary import summarize_class
+from image_store import get_image_store
+import model_registry
+from class_summary import summarize_class, summarize_class_stream
+from audio_capture import MicrophoneCapture
+from session_recorder import SessionRecorder
+from voice_activity import EnergyEndpointer, trim_silence
+from transcription import get_transcriber, save_transcript
 
 app = Flask(__name__)
 
+DEBUG = True
+# Shared models load in the serving process before the first request (see the bottom of
+# this file). PRELOAD_MODELS=1 loads them at import instead, for WSGI servers that import
+# main:app and fork workers that should inherit them; PRELOAD_MODELS=0 leaves them lazy.
+PRELOAD_MODELS = os.getenv('PRELOAD_MODELS')
+if PRELOAD_MODELS == '1':
+    model_registry.warm_up()
+
 # ENV config
 PICOVOICE_API_KEY = os.getenv('PICOVOICE_API_KEY')
 AUDIO_DB = "audio_recordings.db"
@@ -20,17 +36,32 @@ AUDIO_FORMAT = pyaudio.paInt16
 CHANNELS = 1
 RATE = 16000
 CHUNK = 512
-RECORD_SECONDS_AFTER_WAKE = 5
-pa = pyaudio.PyAudio()
+RECORD_SECONDS_AFTER_WAKE = 5  # Upper bound; capture normally ends on trailing silence
+COMMAND_PREROLL_SECONDS = 0.3  # Audio kept from just before the wake word fired
+COMMAND_TRAILING_SILENCE_SECONDS = 0.8
+SPEECH_ENERGY_THRESHOLD = 500
+CAPTURE_BUFFER_SECONDS = 10
+SEGMENT_SECONDS = 300  # Session audio is rotated into 5-minute WAV segments
+WAKE_WORD_PATH = "Wakeup word\\Hey-Echo_en_windows_v3_0_0.ppn"
+
+# Audio devices and models are opened on first use so the module imports without hardware.
+pa = None
+porcupine = None
+mic = None  # Shared AudioCapture, created on start_recording
+session_id = None  # Names the recording session; tags its audio segments and transcripts
+transcriber = None  # Speech-to-text backend picked by STT_BACKEND, created on start_recording
+
+# Late "upgrade" images for recent /visual_generator requests, keyed by request id
+MAX_VISUAL_UPGRADES = 200
+visual_upgrades = OrderedDict()
+visual_upgrades_lock = threading.Lock()
+IMAGE_CACHE_SECONDS = 365 * 24 * 3600  # Stored images are content-addressed, so never stale
 
 # Control flags
 recording_active = threading.Event()
 wake_word_detected = threading.Event()
 wake_word_thread_running = threading.Event()
 
-# Initialize Porcupine
-porcupine = pvporcupine.create(access_key=PICOVOICE_API_KEY, keyword_paths=["Wakeup word\Hey-Echo_en_windows_v3_0_0.ppn"])
-
 
 # === ROUTES ===
 
@@ -40,23 +71,23 @@ def index():
 
 @app.route('/start_recording', methods=['POST'])
 def start_recording():
+    global pa
     if not recording_active.is_set():
-        recording_active.set()
-        threading.Thread(target=continuous_recording, daemon=True).start()
-        
-        if not wake_word_thread_running.is_set():
-            wake_word_thread_running.set()
-            threading.Thread(target=detect_wake_word, daemon=True).start()
-
+        if pa is None:
+            pa = pyaudio.PyAudio()
+        start_audio_pipeline(MicrophoneCapture(pa, rate=RATE, channels=CHANNELS, audio_format=AUDIO_FORMAT,
+                                               chunk=CHUNK, buffer_seconds=CAPTURE_BUFFER_SECONDS))
+        start_precompute_worker()  # New transcripts get a summary and quiz draft ready in the background
         return jsonify({"message": "Recording and wake word listening started."})
     return jsonify({"error": "Already recording."})
 
 @app.route('/stop_recording', methods=['POST'])
 def stop_recording():
+    global pa
     if recording_active.is_set():
-        recording_active.clear()
-        porcupine.delete()
+        stop_audio_pipeline()
         pa.terminate()
+        pa = None
         return jsonify({"message": "Recording stopped."})
     return jsonify({"error": "Not currently recording."})
 
@@ -64,112 +95,247 @@ def stop_recording():
 @app.route('/pdf_summary', methods=['POST'])
 def pdf_summary():
     question = request.json.get('question', 'What is the main topic of the document?')
-    summarizer = PDFSummarizer()
-    response = summarizer.user_input(question)
+    if wants_stream():
+        return sse_response(get_pdf_summarizer().user_input_stream(question))
+    response = get_pdf_summarizer().user_input(question)
     return jsonify({"response": response})
 
 @app.route('/quiz_generator', methods=['POST'])
 def quiz_generator():
     input_text = request.json.get('input', 'Generate a quiz based on the class data.')
+    window = transcript_window(request.json)
+    if not window and is_class_data_request(input_text):
+        # Drafted in the background from the same transcripts, if none have arrived since
+        quiz = get_precomputed("quiz_draft")
+        if quiz:
+            return sse_response([quiz]) if wants_stream() else jsonify({"quiz": quiz, "precomputed": True})
     quiz_generator = QuizGenerator()
-    quiz = quiz_generator.generate_quiz(input_text)
+    if wants_stream():
+        return sse_response(quiz_generator.generate_quiz_stream(input_text, **window))
+    quiz = quiz_generator.generate_quiz(input_text, **window)
     return jsonify({"quiz": quiz}) if quiz else jsonify({"error": "Quiz generation failed."})
 
+@app.route('/quiz_generator/stats', methods=['GET'])
+def quiz_generator_stats():
+    return jsonify({"intent_paths": intent_stats()})
+
 @app.route('/visual_generator', methods=['POST'])
 def visual_generator():
     query = request.json.get('query', 'sunset over the mountains')
+    request_id = uuid.uuid4().hex
     visual_generator = VisualGenerator()
-    best_image, _ = visual_generator.run_all_image_generators(query)
-    return jsonify({"best_image_url": best_image}) if best_image else jsonify({"error": "No image found."})
+    result = visual_generator.run_image_generators_with_deadline(
+        query, on_upgrade=lambda upgrade: store_visual_upgrade(request_id, upgrade)
+    )
+    if not result["best_image_url"]:
+        return jsonify({"error": "No image found.", "sources": result["sources"]})
+    return jsonify({
+        "best_image_url": result["best_image_url"],
+        "best_source": result["best_source"],
+        "sources": result["sources"],
+        "request_id": request_id,
+        "upgrade_window": result["upgrade_window"],
+    })
+
+@app.route('/visual_generator/<request_id>', methods=['GET'])
+def visual_generator_upgrade(request_id):
+    with visual_upgrades_lock:
+        upgrade = visual_upgrades.get(request_id)
+    return jsonify({"upgrade": upgrade})
+
+@app.route('/images/<name>', methods=['GET'])
+def stored_image(name):
+    path = get_image_store().resolve(name)
+    if path is None:
+        abort(404)
+    # The name is the content hash, so it doubles as a strong ETag
+    response = send_file(path, conditional=True, etag=name.split('.')[0], max_age=IMAGE_CACHE_SECONDS)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
 
 @app.route('/class_summary', methods=['GET'])
 def class_summary():
-    summary = summarize_class()
+    window = transcript_window(request.args)
+    if not window:
+        summary = get_precomputed("class_summary")
+        if summary:
+            return sse_response([summary]) if wants_stream() else jsonify({"class_summary": summary, "precomputed": True})
+    if wants_stream():
+        return sse_response(summarize_class_stream(**window))
+    summary = summarize_class(**window)
     return jsonify({"class_summary": summary}) if summary and summary != "None" else jsonify({"error": "No summary."})
 
 
+def is_class_data_request(input_text):
+    """True when the quiz request clearly means "use the class data" rather than a topic."""
+    topic, confidence = classify_by_rules(input_text)
+    return topic is None and confidence >= INTENT_CONFIDENCE_THRESHOLD
+
+def transcript_window(params):
+    """Picks the transcript window (session, since, until, last_minutes) out of request parameters."""
+    window = {key: params[key] for key in ('session', 'since', 'until') if params.get(key)}
+    if params.get('last_minutes'):
+        window['last_minutes'] = float(params['last_minutes'])
+    return window
+
+def wants_stream():
+    """True when the client asked for Server-Sent Events (?stream=1 or Accept: text/event-stream)."""
+    return request.args.get('stream') == '1' or 'text/event-stream' in request.headers.get('Accept', '')
+
+def sse_response(chunks):
+    """Streams text chunks as Server-Sent Events: a `data` event per chunk, then `done`."""
+    def events():
+        try:
+            for chunk in chunks:
+                if chunk:
+                    yield f"data: {json.dumps({'text': chunk})}\n\n"
+        except Exception as e:
+            print(f"❌ Error while streaming: {e}")
+            yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+        yield "event: done\ndata: {}\n\n"
+
+    # No-buffering headers so a reverse proxy forwards each token immediately
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+# === AUDIO PIPELINE ===
+
+def start_audio_pipeline(capture):
+    """Starts recording, live transcription and wake word listening on one AudioCapture."""
+    global mic, transcriber, porcupine, session_id
+    recording_active.set()
+    session_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+    if transcriber is None:
+        transcriber = get_transcriber()
+    if porcupine is None:
+        porcupine = pvporcupine.create(access_key=PICOVOICE_API_KEY, keyword_paths=[WAKE_WORD_PATH])
+
+    mic = capture
+    threading.Thread(target=continuous_recording, daemon=True).start()
+    threading.Thread(target=live_transcription, daemon=True).start()
+
+    if not wake_word_thread_running.is_set():
+        wake_word_thread_running.set()
+        threading.Thread(target=detect_wake_word, daemon=True).start()
+
+    # Consumers subscribe as they start; capture begins last so they see the first chunk.
+    mic.start()
+
+
+def stop_audio_pipeline():
+    global porcupine
+    recording_active.clear()
+    mic.stop()
+    while wake_word_thread_running.is_set():
+        time.sleep(0.1)
+    porcupine.delete()
+    porcupine = None
+
+
 # === THREAD FUNCTIONS ===
 
 def continuous_recording():
     print("🎙️ Continuous recording started.")
-    stream = pa.open(
-        format=AUDIO_FORMAT,
-        channels=CHANNELS,
+    subscriber = mic.subscribe()
+
+    timestamp = session_id
+    recorder = SessionRecorder(
+        timestamp,
         rate=RATE,
-        input=True,
-        frames_per_buffer=CHUNK
+        channels=CHANNELS,
+        sample_width=pyaudio.get_sample_size(AUDIO_FORMAT),
+        segment_seconds=SEGMENT_SECONDS,
+        on_segment_closed=save_audio_to_db
     )
 
-    frames = []
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"recording_session_{timestamp}.wav"
-
     while recording_active.is_set():
-        data = stream.read(CHUNK)
-        frames.append(data)
-
-    stream.stop_stream()
-    stream.close()
-
-    with wave.open(filename, 'wb') as wf:
-        wf.setnchannels(CHANNELS)
-        wf.setsampwidth(pa.get_sample_size(AUDIO_FORMAT))
-        wf.setframerate(RATE)
-        wf.writeframes(b''.join(frames))
+        data = subscriber.read_frames(CHUNK)
+        if data is None:
+            break
+        recorder.write(data)
+
+    recorder.close()
+    print(f"✅ Recording session saved: recording_session_{timestamp}")
+
+
+def live_transcription():
+    print("📝 Live transcription started.")
+    subscriber = mic.subscribe()
+    session = session_id
+    stream = transcriber.stream(
+        RATE,
+        pyaudio.get_sample_size(AUDIO_FORMAT),
+        on_partial=lambda text: print(f"💬 {text}"),
+        on_final=lambda text: save_transcript(text, session=session)
+    )
 
-    save_audio_to_db(filename)
-    print(f"✅ Recording session saved: {filename}")
+    try:
+        while recording_active.is_set():
+            data = subscriber.read_frames(CHUNK)
+            if data is None:
+                break
+            stream.accept(data)
+        stream.finish()
+    except Exception as e:
+        print(f"❌ Error in live transcription: {e}")
 
 
 def detect_wake_word():
     print("👂 Wake word detection started.")
-    stream = pa.open(
-        rate=porcupine.sample_rate,
-        channels=CHANNELS,
-        format=AUDIO_FORMAT,
-        input=True,
-        frames_per_buffer=porcupine.frame_length
-    )
+    subscriber = mic.subscribe()
 
     while True:
         if not recording_active.is_set():
             break  # Exit when recording is stopped
 
-        pcm = stream.read(porcupine.frame_length, exception_on_overflow=False)
+        pcm = subscriber.read_frames(porcupine.frame_length)
+        if pcm is None:
+            break
         pcm = memoryview(pcm).cast('h')
         if porcupine.process(pcm) >= 0:
             print("🚀 Wake word 'Jarvis' detected!")
             threading.Thread(target=record_after_wake_word, daemon=True).start()
 
-    stream.stop_stream()
-    stream.close()
     wake_word_thread_running.clear()
 
 
 def record_after_wake_word():
     print("🎧 Recording short command after wake word...")
-    stream = pa.open(
-        format=AUDIO_FORMAT,
-        channels=CHANNELS,
-        rate=RATE,
-        input=True,
-        frames_per_buffer=CHUNK
+    # Reach back into the shared buffer so the first syllable isn't clipped. The pre-roll
+    # also holds the end of the wake phrase, so the endpointer doesn't count it as speech.
+    subscriber = mic.subscribe(preroll_seconds=COMMAND_PREROLL_SECONDS)
+    preroll_seconds = (mic.ring.write_pos - subscriber.position) / (mic.frame_bytes * RATE)
+    endpointer = EnergyEndpointer(
+        RATE,
+        threshold=SPEECH_ENERGY_THRESHOLD,
+        trailing_silence_seconds=COMMAND_TRAILING_SILENCE_SECONDS,
+        max_seconds=RECORD_SECONDS_AFTER_WAKE + preroll_seconds,
+        preroll_seconds=preroll_seconds
     )
     frames = []
-    for _ in range(0, int(RATE / CHUNK * RECORD_SECONDS_AFTER_WAKE)):
-        data = stream.read(CHUNK)
+    while True:
+        data = subscriber.read_frames(CHUNK)
+        if data is None:
+            break
         frames.append(data)
+        if endpointer.feed(data):
+            break
+    subscriber.close()
 
-    stream.stop_stream()
-    stream.close()
-
-    recognizer = sr.Recognizer()
-    # Convert raw audio frames into AudioData for speech_recognition
-    audio_data = sr.AudioData(b''.join(frames), RATE, pa.get_sample_size(AUDIO_FORMAT))
+    # Only the voiced part goes to the recognizer.
+    command_audio = trim_silence(b''.join(frames), RATE, threshold=endpointer.threshold)
+    if not command_audio:
+        print("🤫 No speech heard after wake word.")
+        return
 
     try:
-        print("🧠 Transcribing command using Google Speech Recognition...")
-        command = recognizer.recognize_google(audio_data).lower()
+        print(f"🧠 Transcribing command using {transcriber.name} speech recognition...")
+        command = transcriber.transcribe(command_audio, RATE, pyaudio.get_sample_size(AUDIO_FORMAT))
+        if not command:
+            print("❌ Speech recognition could not understand the audio.")
+            return
         print(f"🗣️ Command: {command}")
 
         # You can now act on the command
@@ -180,13 +346,18 @@ def record_after_wake_word():
         else:
             print("🤔 Command not recognized.")
 
-    except sr.UnknownValueError:
-        print("❌ Google Speech Recognition could not understand the audio.")
-    except sr.RequestError as e:
-        print(f"❌ Could not request results from Google Speech Recognition service; {e}")
+    except Exception as e:
+        print(f"❌ Could not request results from the speech recognition service; {e}")
+
+
+def store_visual_upgrade(request_id, upgrade):
+    with visual_upgrades_lock:
+        visual_upgrades[request_id] = upgrade
+        while len(visual_upgrades) > MAX_VISUAL_UPGRADES:
+            visual_upgrades.popitem(last=False)
 
 
-def save_audio_to_db(filename):
+def save_audio_to_db(filename, session=None, start_offset=None, end_offset=None):
     conn = sqlite3.connect(AUDIO_DB)
     cursor = conn.cursor()
     cursor.execute("""
@@ -196,11 +367,28 @@ def save_audio_to_db(filename):
             timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
         )
     """)
-    cursor.execute("INSERT INTO recordings (filename) VALUES (?)", (filename,))
+    # Older databases predate segment rotation; add the offset columns in place.
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(recordings)")}
+    for column, column_type in (("session", "TEXT"), ("start_offset", "REAL"), ("end_offset", "REAL")):
+        if column not in columns:
+            cursor.execute(f"ALTER TABLE recordings ADD COLUMN {column} {column_type}")
+    cursor.execute(
+        "INSERT INTO recordings (filename, session, start_offset, end_offset) VALUES (?, ?, ?, ?)",
+        (filename, session, start_offset, end_offset)
+    )
     conn.commit()
     conn.close()
 
 
+def is_serving_process(debug=DEBUG):
+    """False in the debug reloader's parent, which only watches files and never serves."""
+    return not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'
+
+
 # === RUN APP ===
 if __name__ == '__main__':
-    app.run(debug=True)
+    if is_serving_process():
+        if PRELOAD_MODELS is None:
+            model_registry.warm_up()
+        start_precompute_worker()
+    app.run(debug=DEBUG)
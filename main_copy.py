@@ -3,7 +3,6 @@ from flask_socketio import SocketIO, emit
 import threading, os, time
 import wave, sqlite3, pyaudio, pvporcupine
 from datetime import datetime
-import speech_recognition as sr
 from langchain.agents import initialize_agent, AgentType
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.tools import Tool
@@ -12,6 +11,8 @@ import atexit
 
 from db_manager import save_audio_to_db
 from agents import handle_query
+from transcription import get_transcriber, save_transcript
+from voice_activity import SpeechWindower
 
 app = Flask(__name__)
 socketio = SocketIO(app, cors_allowed_origins="*") 
@@ -30,6 +31,7 @@ RATE = 16000
 CHUNK = 512
 RECORD_SECONDS_AFTER_WAKE = 5
 pa = pyaudio.PyAudio()
+transcriber = get_transcriber()  # Backend picked by STT_BACKEND
 
 # Control flags
 recording_active = threading.Event()
@@ -99,37 +101,34 @@ def continuous_recording():
             frames_per_buffer=CHUNK
         )
 
-        frames = []
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         filename = f"recording_session_{timestamp}.wav"
         file_path = os.path.join(Audio_folder, filename)
 
-        start_time = time.time()
-        last_action_time = start_time
+        # Windows target ~2 minutes but are cut on a speech pause; silent stretches are skipped.
         ACTION_INTERVAL = 120  # 2 minutes in seconds
-
-        while recording_active.is_set():
-            data = stream.read(CHUNK)
-            frames.append(data)
-
-            current_time = time.time()
-            # Every 2 minutes, trigger autonomous agent action
-            if (current_time - last_action_time) >= ACTION_INTERVAL:
-                print("⏰ 2 minutes reached, triggering autonomous agent action.")
-                # Use a copy of frames for the last 2 minutes
-                frames_for_action = frames.copy()
-                threading.Thread(target=autonomous_agent_action, args=(frames_for_action,), daemon=True).start()
-                last_action_time = current_time
-                frames = []  # Reset frames for next interval
-
-        stream.stop_stream()
-        stream.close()
+        windower = SpeechWindower(RATE, target_seconds=ACTION_INTERVAL, max_seconds=ACTION_INTERVAL * 1.5)
 
         with wave.open(file_path, 'wb') as wf:
             wf.setnchannels(CHANNELS)
             wf.setsampwidth(pa.get_sample_size(AUDIO_FORMAT))
             wf.setframerate(RATE)
-            wf.writeframes(b''.join(frames))
+
+            while recording_active.is_set():
+                data = stream.read(CHUNK)
+                wf.writeframes(data)
+
+                window = windower.feed(data)
+                if window is not None:
+                    print("⏰ Speech window complete, triggering autonomous agent action.")
+                    threading.Thread(target=autonomous_agent_action, args=(window,), daemon=True).start()
+
+        window = windower.flush()
+        if window is not None:
+            threading.Thread(target=autonomous_agent_action, args=(window,), daemon=True).start()
+
+        stream.stop_stream()
+        stream.close()
 
         save_audio_to_db(filename)
         print(f"✅ Recording session saved: {filename}")
@@ -137,16 +136,18 @@ def continuous_recording():
     except Exception as e:
         print(f"❌ Error continously audio recording stream: {e}")
 
-def autonomous_agent_action(frames):
+def autonomous_agent_action(audio):
     """ 
-    Process the last 2 minutes of audio and trigger autonomous agent action.
+    Process one speech window (a memoryview of raw PCM) and trigger autonomous agent action.
     """
-    audio_data = sr.AudioData(b''.join(frames), RATE, pa.get_sample_size(AUDIO_FORMAT))
-    recognizer = sr.Recognizer()
     try:
-        print("🧠 Transcribing 2-min audio for autonomous agent action...")
-        transcript = recognizer.recognize_google(audio_data).lower()
+        print("🧠 Transcribing speech window for autonomous agent action...")
+        transcript = transcriber.transcribe(audio, RATE, pa.get_sample_size(AUDIO_FORMAT))
+        if not transcript:
+            print("🤫 Nothing intelligible in this window.")
+            return
         print(f"🗣️ Transcript: {transcript}")
+        save_transcript(transcript)
 
         # Call agent with full transcript
         prompt = (
@@ -208,20 +209,17 @@ def record_after_wake_word():
     stream.stop_stream()
     stream.close()
 
-    recognizer = sr.Recognizer()
-    # Convert raw audio frames into AudioData for speech_recognition
-    audio_data = sr.AudioData(b''.join(frames), RATE, pa.get_sample_size(AUDIO_FORMAT))
-
     try:
-        print("🧠 Transcribing command using Google Speech Recognition...")
-        command = recognizer.recognize_google(audio_data).lower()
+        print(f"🧠 Transcribing command using {transcriber.name} speech recognition...")
+        command = transcriber.transcribe(b''.join(frames), RATE, pa.get_sample_size(AUDIO_FORMAT))
+        if not command:
+            print("❌ Speech recognition could not understand the audio.")
+            return
         print(f"🗣️ Command: {command}")
         handle_query(command)
 
-    except sr.UnknownValueError:
-        print("❌ Google Speech Recognition could not understand the audio.")
-    except sr.RequestError as e:
-        print(f"❌ Could not request results from Google Speech Recognition service; {e}")
+    except Exception as e:
+        print(f"❌ Could not request results from the speech recognition service; {e}")
 
 
 # === RUN APP ===
@@ -0,0 +1,99 @@
+"""Process-wide registry for the embedding models shared by every request.
+
+Models load lazily on first use, exactly once, behind a lock. Call `warm_up()` at startup
+to pay the load cost before the first request; when a server forks workers from a
+preloaded parent (e.g. `gunicorn --preload`), the workers share the weights copy-on-write.
+"""
+import gc
+import os
+import threading
+
+import clip
+import torch
+from sentence_transformers import SentenceTransformer
+
+SENTENCE_MODEL_NAME = "all-MiniLM-L6-v2"
+CLIP_MODEL_NAME = "ViT-B/32"
+
+# Optional cap on resident model weights, e.g. MODEL_MEMORY_BUDGET_MB=1024.
+MODEL_MEMORY_BUDGET_MB = int(os.getenv("MODEL_MEMORY_BUDGET_MB", "0")) or None
+
+# Approximate fp32 footprints, used to refuse a load before it happens.
+ESTIMATED_MODEL_MB = {
+    SENTENCE_MODEL_NAME: 90,
+    CLIP_MODEL_NAME: 350,
+}
+
+_lock = threading.Lock()
+_models = {}
+_model_mb = {}
+
+
+def model_memory_mb(model):
+    """Size of a torch module's parameters and buffers in MB."""
+    tensors = list(model.parameters()) + list(model.buffers())
+    return sum(t.numel() * t.element_size() for t in tensors) / 2**20
+
+
+def loaded_memory_mb():
+    return sum(_model_mb.values())
+
+
+def _check_budget(name):
+    if MODEL_MEMORY_BUDGET_MB is None:
+        return
+    needed = loaded_memory_mb() + ESTIMATED_MODEL_MB.get(name, 0)
+    if needed > MODEL_MEMORY_BUDGET_MB:
+        raise MemoryError(
+            f"Loading {name} needs ~{needed:.0f} MB, over MODEL_MEMORY_BUDGET_MB={MODEL_MEMORY_BUDGET_MB}."
+        )
+
+
+def _get(name, loader):
+    model = _models.get(name)
+    if model is not None:
+        return model
+    with _lock:
+        # Another thread may have finished loading while we waited.
+        if name not in _models:
+            _check_budget(name)
+            print(f"📦 Loading model {name}...")
+            model = loader()
+            _models[name] = model
+            _model_mb[name] = model_memory_mb(model[0] if isinstance(model, tuple) else model)
+        return _models[name]
+
+
+def get_device():
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def get_sentence_model():
+    """Shared MiniLM sentence encoder."""
+    def load():
+        model = SentenceTransformer(SENTENCE_MODEL_NAME, device=get_device())
+        model.eval()
+        return model
+    return _get(SENTENCE_MODEL_NAME, load)
+
+
+def get_clip_model():
+    """Shared CLIP model; returns (model, preprocess)."""
+    def load():
+        model, preprocess = clip.load(CLIP_MODEL_NAME, device=get_device())
+        model.eval()
+        return model, preprocess
+    return _get(CLIP_MODEL_NAME, load)
+
+
+def warm_up():
+    """Loads every model up front and moves them out of the garbage collector's reach.
+
+    Freezing keeps the collector from touching the weights' object headers, so pages
+    shared with forked workers aren't copied just because a GC pass ran.
+    """
+    get_sentence_model()
+    get_clip_model()
+    gc.collect()
+    gc.freeze()
+    print(f"🔥 Models warmed up ({loaded_memory_mb():.0f} MB resident).")
@@ -0,0 +1,198 @@
+"""Incremental ingestion of PDFs into the faiss_index/ vector store used by pdf_summary.py.
+
+Pages are read one at a time and cut into chunks as they stream in. Each chunk is
+keyed by a hash of its text, so chunks already in the store (from this or any other
+document) are not embedded again. New chunks are embedded in batches and appended to
+the existing FAISS index. A manifest next to the index records which documents and
+chunks it holds, so adding a chapter only costs that chapter's new chunks:
+
+    python pdf_ingest.py chapter7.pdf chapter8.pdf
+
+The store is saved by renaming files into place, manifest last. On load the manifest
+is reconciled with the docstore, so a save interrupted between renames never leaves
+ids that would be added twice. A running server's PDFSummarizer picks up the new
+index on its next reload check.
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_community.vectorstores import FAISS
+from langchain_google_genai import GoogleGenerativeAIEmbeddings
+from pypdf import PdfReader
+
+from pdf_summary import EMBEDDING_MODEL, FAISS_INDEX_DIR, GEMINI_API_KEY
+
+MANIFEST_NAME = "manifest.json"
+CHUNK_SIZE = 10000
+CHUNK_OVERLAP = 1000
+EMBED_BATCH_SIZE = 100  # Chunks per embedding request
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_hash(text):
+    """Hash of the chunk text with whitespace collapsed, so re-extracted copies match."""
+    return hashlib.sha256(re.sub(r"\s+", " ", text).strip().encode("utf-8")).hexdigest()
+
+
+def stream_chunks(path, splitter):
+    """Yields (text, first_page) chunks while reading the PDF one page at a time."""
+    buffer, buffer_page = "", 1
+    for page_number, page in enumerate(PdfReader(path).pages, start=1):
+        text = page.extract_text() or ""
+        if not buffer:
+            buffer_page = page_number
+        buffer += text + "\n"
+        if len(buffer) < 2 * CHUNK_SIZE:
+            continue
+        # Emit all but the last chunk; it may continue on the next page.
+        chunks = splitter.split_text(buffer)
+        for chunk in chunks[:-1]:
+            yield chunk, buffer_page
+        buffer, buffer_page = chunks[-1], page_number
+    if buffer.strip():
+        for chunk in splitter.split_text(buffer):
+            yield chunk, buffer_page
+
+
+class PDFIngestor:
+    def __init__(self, index_dir=FAISS_INDEX_DIR, batch_size=EMBED_BATCH_SIZE):
+        self.index_dir = index_dir
+        self.batch_size = batch_size
+        self.manifest_path = os.path.join(index_dir, MANIFEST_NAME)
+        self.embeddings = GoogleGenerativeAIEmbeddings(model=EMBEDDING_MODEL, google_api_key=GEMINI_API_KEY)
+        self.splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+
+        self.db = None
+        self.unsaved_chunks = 0
+        if os.path.exists(os.path.join(index_dir, "index.faiss")):
+            self.db = FAISS.load_local(index_dir, self.embeddings, allow_dangerous_deserialization=True)
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self):
+        manifest = {"documents": {}, "chunks": {}}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, encoding="utf-8") as f:
+                manifest = json.load(f)
+        if self.db is not None:
+            self._reconcile_manifest(manifest)
+        return manifest
+
+    def _reconcile_manifest(self, manifest):
+        """Makes manifest["chunks"] match the docstore ids actually in the index.
+
+        Covers indexes built before the manifest existed and saves interrupted after the
+        index was renamed into place but before the manifest was.
+        """
+        stored_ids = set(self.db.index_to_docstore_id.values())
+        known_ids = set(manifest["chunks"].values())
+        registered = 0
+        for docstore_id in stored_ids - known_ids:
+            document = self.db.docstore.search(docstore_id)
+            if hasattr(document, "page_content"):
+                manifest["chunks"][chunk_hash(document.page_content)] = docstore_id
+                registered += 1
+
+        # Chunks the manifest lists but the index lost are embedded again when next seen
+        missing = {digest for digest, docstore_id in manifest["chunks"].items() if docstore_id not in stored_ids}
+        for digest in missing:
+            del manifest["chunks"][digest]
+        for document_hash, document in list(manifest["documents"].items()):
+            if missing.intersection(document["chunks"]):
+                del manifest["documents"][document_hash]
+        if registered or missing:
+            print(f"📋 Manifest reconciled with the index: {registered} chunks registered, {len(missing)} dropped")
+
+    def _add_batch(self, batch):
+        texts = [text for _, text, _ in batch]
+        vectors = self.embeddings.embed_documents(texts)
+        ids = [digest for digest, _, _ in batch]
+        metadatas = [metadata for _, _, metadata in batch]
+        if self.db is None:
+            self.db = FAISS.from_embeddings(list(zip(texts, vectors)), self.embeddings, metadatas=metadatas, ids=ids)
+        else:
+            self.db.add_embeddings(list(zip(texts, vectors)), metadatas=metadatas, ids=ids)
+        for digest in ids:
+            self.manifest["chunks"][digest] = digest
+        self.unsaved_chunks += len(ids)
+
+    def ingest(self, path):
+        """Adds one PDF; returns the number of chunks that were embedded."""
+        document_hash = file_hash(path)
+        if document_hash in self.manifest["documents"]:
+            print(f"⏭️ {path} is already indexed")
+            return 0
+
+        name = os.path.basename(path)
+        chunk_ids, batch, added, seen = [], [], 0, set()
+        for text, page in stream_chunks(path, self.splitter):
+            digest = chunk_hash(text)
+            chunk_ids.append(digest)
+            if digest in self.manifest["chunks"] or digest in seen:
+                continue
+            seen.add(digest)
+            batch.append((digest, text, {"source": name, "page": page}))
+            if len(batch) >= self.batch_size:
+                self._add_batch(batch)
+                added += len(batch)
+                batch = []
+        if batch:
+            self._add_batch(batch)
+            added += len(batch)
+
+        self.manifest["documents"][document_hash] = {
+            "name": name,
+            "chunks": chunk_ids,
+            "added": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        print(f"📄 {name}: {len(chunk_ids)} chunks, {added} new")
+        return added
+
+    def save(self):
+        """Writes the index, docstore and manifest so readers never see a partial file."""
+        tmp_dir = f"{self.index_dir}.tmp"
+        os.makedirs(tmp_dir, exist_ok=True)
+        names = []
+        if self.unsaved_chunks:
+            self.db.save_local(tmp_dir)
+            # The docstore goes first: a reader that catches the old index with the new
+            # docstore still finds every id it searches for.
+            names += ["index.pkl", "index.faiss"]
+        with open(os.path.join(tmp_dir, MANIFEST_NAME), "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f)
+        names.append(MANIFEST_NAME)
+
+        os.makedirs(self.index_dir, exist_ok=True)
+        for name in names:
+            os.replace(os.path.join(tmp_dir, name), os.path.join(self.index_dir, name))
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if self.unsaved_chunks:
+            print(f"✅ PDF index holds {self.db.index.ntotal} chunks -> {self.index_dir}")
+            self.unsaved_chunks = 0
+
+
+def ingest_pdfs(paths, index_dir=FAISS_INDEX_DIR):
+    ingestor = PDFIngestor(index_dir)
+    added = sum(ingestor.ingest(path) for path in paths)
+    ingestor.save()
+    return added
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Add PDFs to the faiss_index/ vector store.")
+    parser.add_argument("pdfs", nargs="+")
+    parser.add_argument("--index-dir", default=FAISS_INDEX_DIR)
+    args = parser.parse_args()
+    ingest_pdfs(args.pdfs, args.index_dir)
@@ -4,14 +4,35 @@ from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.prompts import PromptTemplate
 from langchain.chains.question_answering import load_qa_chain
 from dotenv import load_dotenv
-import os
+import os, threading, time, hashlib
+from qa_cache import QACache, normalize_question
 
 load_dotenv()
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
+FAISS_INDEX_DIR = "faiss_index"
+EMBEDDING_MODEL = "models/embedding-001"
+RELOAD_CHECK_SECONDS = 5  # How often to look for a rebuilt index on disk
+RETRIEVED_CHUNKS = 4
 
 class PDFSummarizer:
-    def __init__(self):
-        self.embeddings = GoogleGenerativeAIEmbeddings(model="models/embedding-001", google_api_key=GEMINI_API_KEY)
+    """Answers questions over the PDF vector store.
+
+    The embeddings client, QA chain and vector store are built once and shared by every
+    request. When faiss_index/index.faiss changes on disk, the new store is loaded in
+    full and then swapped in; questions already running keep the store they started with.
+
+    Question embeddings and answers are cached in SQLite (see qa_cache.py). An answer is
+    reused only for the same normalized question, the same retrieved chunks and the same
+    index version.
+    """
+    def __init__(self, index_dir=FAISS_INDEX_DIR):
+        self.index_dir = index_dir
+        self.embeddings = GoogleGenerativeAIEmbeddings(model=EMBEDDING_MODEL, google_api_key=GEMINI_API_KEY)
+        self.chain = self.get_conversational_chain()
+        self.cache = QACache()
+        self._store = None  # (vector store, index version), swapped as one reference
+        self._last_check = 0.0
+        self._lock = threading.Lock()
 
     def get_conversational_chain(self):
         prompt_template = """
@@ -25,16 +46,101 @@ class PDFSummarizer:
 
         model = ChatGoogleGenerativeAI(api_key=GEMINI_API_KEY, model="gemini-2.0-flash", temperature=0.3)
         prompt = PromptTemplate(template=prompt_template, input_variables=["context", "question"])
-        
+
         # Updated chain_type to "map_reduce"
         chain = load_qa_chain(model, chain_type="stuff", prompt=prompt)
 
         return chain
 
+    def _signature(self):
+        signature = []
+        for name in ("index.faiss", "index.pkl"):
+            try:
+                signature.append(os.stat(os.path.join(self.index_dir, name)).st_mtime_ns)
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    def snapshot(self):
+        """Returns (vector store, index version), reloading first if the index files changed."""
+        now = time.monotonic()
+        if self._store is not None and now - self._last_check < RELOAD_CHECK_SECONDS:
+            return self._store
+
+        with self._lock:
+            if self._store is None or now - self._last_check >= RELOAD_CHECK_SECONDS:
+                self._last_check = now
+                signature = self._signature()
+                version = "-".join(str(part) for part in signature)
+                if self._store is None or version != self._store[1]:
+                    db = FAISS.load_local(self.index_dir, self.embeddings, allow_dangerous_deserialization=True)
+                    print(f"📚 PDF index loaded: {db.index.ntotal} chunks")
+                    # Swap only once the new store is fully loaded
+                    self._store = (db, version)
+                    self.cache.drop_other_versions(version)
+        return self._store
+
+    def vector_store(self):
+        return self.snapshot()[0]
+
+    def embed_question(self, question):
+        """Embeds the question, using the local cache before calling the embeddings API."""
+        normalized = normalize_question(question)
+        vector = self.cache.get_query_embedding(EMBEDDING_MODEL, normalized)
+        if vector is None:
+            vector = self.embeddings.embed_query(question)
+            self.cache.put_query_embedding(EMBEDDING_MODEL, normalized, vector)
+        return vector
+
+    def answer_key(self, question, docs, version):
+        chunk_ids = [hashlib.sha256(doc.page_content.encode("utf-8")).hexdigest() for doc in docs]
+        return hashlib.sha256("\n".join([normalize_question(question), version] + chunk_ids).encode("utf-8")).hexdigest()
+
+    def retrieve(self, user_question):
+        """Returns (docs, answer cache key, index version, cached answer or None)."""
+        db, version = self.snapshot()
+        docs = db.similarity_search_by_vector(self.embed_question(user_question), k=RETRIEVED_CHUNKS)
+        key = self.answer_key(user_question, docs, version)
+        return docs, key, version, self.cache.get_answer(key)
+
     def user_input(self, user_question):
-        new_db = FAISS.load_local("faiss_index", self.embeddings, allow_dangerous_deserialization=True)
-        docs = new_db.similarity_search(user_question)
+        docs, key, version, answer = self.retrieve(user_question)
+        if answer is not None:
+            print("♻️ Reusing cached PDF answer")
+            return answer
+
+        response = self.chain.invoke({"input_documents": docs, "question": user_question})
+        self.cache.put_answer(key, version, response["output_text"])
+        return response["output_text"]
+
+    def user_input_stream(self, user_question):
+        """Like user_input, but yields the answer in pieces as the model produces them."""
+        docs, key, version, answer = self.retrieve(user_question)
+        if answer is not None:
+            print("♻️ Reusing cached PDF answer")
+            yield answer
+            return
+
+        # Same prompt the "stuff" chain would build, sent straight to the chat model's stream
+        llm_chain = self.chain.llm_chain
+        context = self.chain.document_separator.join(doc.page_content for doc in docs)
+        parts = []
+        for chunk in llm_chain.llm.stream(llm_chain.prompt.format(context=context, question=user_question)):
+            if chunk.content:
+                parts.append(chunk.content)
+                yield chunk.content
+        self.cache.put_answer(key, version, "".join(parts))
+
+
+_pdf_summarizer = None
+_pdf_summarizer_lock = threading.Lock()
+
 
-        chain = self.get_conversational_chain()
-        response = chain.invoke({"input_documents": docs, "question": user_question})
-        return response["output_text"]
\ No newline at end of file
+def get_pdf_summarizer():
+    """Process-wide PDFSummarizer."""
+    global _pdf_summarizer
+    if _pdf_summarizer is None:
+        with _pdf_summarizer_lock:
+            if _pdf_summarizer is None:
+                _pdf_summarizer = PDFSummarizer()
+    return _pdf_summarizer
@@ -0,0 +1,163 @@
+"""Background pre-computation of the class summary and a quiz draft.
+
+A daemon thread polls the transcript high-water mark (MAX(id) of text_recording). Once
+new rows have stopped arriving for `debounce_seconds` (or `max_delay_seconds` after the
+first new row during a long lesson), it recomputes both results and stores them with
+the high-water mark they cover. Live transcription writes a row about every 30 s, so
+the debounce is set well above that: during a lesson the worker runs on
+`max_delay_seconds`, and once more shortly after the class goes quiet. The routes
+serve a stored result only while that mark is still current, so the teacher never
+gets a stale answer.
+"""
+import os
+import threading
+import time
+from datetime import datetime
+
+from transcripts import TRANSCRIPT_DB, connect
+
+PRECOMPUTE_POLL_SECONDS = 5
+PRECOMPUTE_DEBOUNCE_SECONDS = float(os.getenv("PRECOMPUTE_DEBOUNCE_SECONDS", "90"))  # 3x the transcript cadence
+PRECOMPUTE_MAX_DELAY_SECONDS = float(os.getenv("PRECOMPUTE_MAX_DELAY_SECONDS", "300"))
+DEFAULT_QUIZ_REQUEST = "Generate a quiz based on the class data."
+
+
+def ensure_precomputed_table(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS precomputed_results (
+            kind TEXT PRIMARY KEY,
+            high_water INTEGER,
+            result TEXT,
+            created TEXT
+        )
+    """)
+
+
+def transcript_high_water(conn):
+    return conn.execute("SELECT COALESCE(MAX(id), 0) FROM text_recording").fetchone()[0]
+
+
+def get_precomputed(kind, db_file=TRANSCRIPT_DB):
+    """Returns the stored result for `kind` if no transcript has arrived since it was computed."""
+    conn = connect(db_file)
+    ensure_precomputed_table(conn)
+    row = conn.execute("SELECT high_water, result FROM precomputed_results WHERE kind = ?", (kind,)).fetchone()
+    current = transcript_high_water(conn)
+    conn.close()
+    if row and row[0] == current:
+        return row[1]
+    return None
+
+
+def store_precomputed(kind, high_water, result, db_file=TRANSCRIPT_DB):
+    conn = connect(db_file)
+    ensure_precomputed_table(conn)
+    conn.execute("INSERT OR REPLACE INTO precomputed_results (kind, high_water, result, created) VALUES (?, ?, ?, ?)",
+                 (kind, high_water, result, datetime.now().strftime("%Y-%m-%d %H:%M:%S")))
+    conn.commit()
+    conn.close()
+
+
+def compute_class_summary():
+    from class_summary import summarize_class
+
+    summary = summarize_class()
+    return summary if summary and summary != "None" else None
+
+
+def compute_quiz_draft():
+    from quiz_generator import QuizGenerator
+
+    # A background draft, not a user request, so it stays out of /quiz_generator/stats
+    quiz = QuizGenerator().generate_quiz(DEFAULT_QUIZ_REQUEST, record_intent=False)
+    return quiz if quiz and quiz != "Failed to generate quiz." else None
+
+
+PRECOMPUTE_TASKS = {
+    "class_summary": compute_class_summary,
+    "quiz_draft": compute_quiz_draft,
+}
+
+
+class PrecomputeWorker:
+    def __init__(self, db_file=TRANSCRIPT_DB, debounce_seconds=PRECOMPUTE_DEBOUNCE_SECONDS,
+                 max_delay_seconds=PRECOMPUTE_MAX_DELAY_SECONDS, poll_seconds=PRECOMPUTE_POLL_SECONDS):
+        self.db_file = db_file
+        self.debounce_seconds = debounce_seconds
+        self.max_delay_seconds = max_delay_seconds
+        self.poll_seconds = poll_seconds
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="precompute", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _state(self):
+        """Returns (current high-water mark, lowest mark any stored result covers)."""
+        conn = connect(self.db_file)
+        ensure_precomputed_table(conn)
+        current = transcript_high_water(conn)
+        stored = dict(conn.execute("SELECT kind, high_water FROM precomputed_results").fetchall())
+        conn.close()
+        return current, min(stored.get(kind, -1) for kind in PRECOMPUTE_TASKS)
+
+    def run_once(self, high_water):
+        for kind, task in PRECOMPUTE_TASKS.items():
+            try:
+                start = time.monotonic()
+                result = task()
+                if result is not None:
+                    store_precomputed(kind, high_water, result, self.db_file)
+                    print(f"🗂️ Precomputed {kind} up to transcript {high_water} in {time.monotonic() - start:.1f}s")
+            except Exception as e:
+                print(f"❌ Error precomputing {kind}: {e}")
+
+    def _run(self):
+        print("🗂️ Precompute worker started.")
+        last_seen, first_change, last_change = None, None, None
+        attempted = None  # Mark of the last run, so a failed task is retried only after new rows
+        while not self._stop.is_set():
+            try:
+                current, covered = self._state()
+            except Exception as e:
+                print(f"❌ Precompute worker could not read transcripts: {e}")
+                self._stop.wait(self.poll_seconds)
+                continue
+
+            now = time.monotonic()
+            if current != last_seen:
+                if last_seen is not None:
+                    last_change = now
+                    first_change = first_change or now
+                last_seen = current
+            if current and current != covered and current != attempted:
+                # Results left stale by an earlier run are computed straight away
+                quiet = last_change is None or now - last_change >= self.debounce_seconds
+                overdue = first_change is not None and now - first_change >= self.max_delay_seconds
+                if quiet or overdue:
+                    self.run_once(current)
+                    attempted = current
+                    first_change, last_change = None, None
+            self._stop.wait(self.poll_seconds)
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def start_precompute_worker():
+    """Starts the process-wide worker (once); disable with PRECOMPUTE=0."""
+    global _worker
+    if os.getenv("PRECOMPUTE", "1") != "1":
+        return None
+    with _worker_lock:
+        if _worker is None:
+            _worker = PrecomputeWorker()
+        _worker.start()
+    return _worker
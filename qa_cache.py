@@ -0,0 +1,106 @@
+import os
+import re
+import sqlite3
+import time
+
+import numpy as np
+
+QA_CACHE_DB = "pdf_qa_cache.db"
+QA_CACHE_MAX_ENTRIES = int(os.getenv("QA_CACHE_MAX_ENTRIES", "5000"))  # Per table
+
+
+def normalize_question(question):
+    """Lower-cases, collapses whitespace and drops trailing punctuation."""
+    return re.sub(r"\s+", " ", question).strip().lower().rstrip("?!. ")
+
+
+class QACache:
+    """Persistent caches for PDF Q&A.
+
+    `query_embeddings` maps (embedding model, normalized question) to its vector, so a
+    repeated question needs no remote embedding call. `answers` maps a key built from
+    the normalized question, the retrieved chunk ids and the index version to the
+    generated answer; rows from older index versions are dropped when the index changes.
+    """
+
+    def __init__(self, db_file=QA_CACHE_DB, max_entries=QA_CACHE_MAX_ENTRIES):
+        self.db_file = db_file
+        self.max_entries = max_entries
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS query_embeddings (
+                model TEXT,
+                question TEXT,
+                embedding BLOB,
+                last_used REAL,
+                PRIMARY KEY (model, question)
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS answers (
+                key TEXT PRIMARY KEY,
+                index_version TEXT,
+                answer TEXT,
+                last_used REAL
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_answers_version ON answers (index_version)")
+        conn.commit()
+        conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_file, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _trim(self, conn, table):
+        conn.execute(f"""
+            DELETE FROM {table} WHERE rowid IN (
+                SELECT rowid FROM {table} ORDER BY last_used DESC LIMIT -1 OFFSET ?
+            )
+        """, (self.max_entries,))
+
+    def get_query_embedding(self, model, question):
+        conn = self._connect()
+        row = conn.execute("SELECT embedding FROM query_embeddings WHERE model = ? AND question = ?",
+                           (model, question)).fetchone()
+        if row:
+            conn.execute("UPDATE query_embeddings SET last_used = ? WHERE model = ? AND question = ?",
+                         (time.time(), model, question))
+            conn.commit()
+        conn.close()
+        return np.frombuffer(row[0], dtype=np.float32).tolist() if row else None
+
+    def put_query_embedding(self, model, question, embedding):
+        conn = self._connect()
+        conn.execute("INSERT OR REPLACE INTO query_embeddings (model, question, embedding, last_used) VALUES (?, ?, ?, ?)",
+                     (model, question, np.asarray(embedding, dtype=np.float32).tobytes(), time.time()))
+        self._trim(conn, "query_embeddings")
+        conn.commit()
+        conn.close()
+
+    def get_answer(self, key):
+        conn = self._connect()
+        row = conn.execute("SELECT answer FROM answers WHERE key = ?", (key,)).fetchone()
+        if row:
+            conn.execute("UPDATE answers SET last_used = ? WHERE key = ?", (time.time(), key))
+            conn.commit()
+        conn.close()
+        return row[0] if row else None
+
+    def put_answer(self, key, index_version, answer):
+        conn = self._connect()
+        conn.execute("INSERT OR REPLACE INTO answers (key, index_version, answer, last_used) VALUES (?, ?, ?, ?)",
+                     (key, index_version, answer, time.time()))
+        self._trim(conn, "answers")
+        conn.commit()
+        conn.close()
+
+    def drop_other_versions(self, index_version):
+        """Deletes answers generated against any other version of the index."""
+        conn = self._connect()
+        deleted = conn.execute("DELETE FROM answers WHERE index_version != ?", (index_version,)).rowcount
+        conn.commit()
+        conn.close()
+        if deleted:
+            print(f"🧹 Dropped {deleted} cached answers from an older PDF index")
@@ -0,0 +1,134 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+QUERY_CACHE_DB = "visual_query_cache.db"
+QUERY_CACHE_THRESHOLD = float(os.getenv("QUERY_CACHE_THRESHOLD", "0.9"))
+QUERY_CACHE_TTL_SECONDS = float(os.getenv("QUERY_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "2000"))
+
+
+class SemanticQueryCache:
+    """Caches visual generation results by query meaning rather than exact text.
+
+    Queries are compared by cosine similarity of their normalized MiniLM embeddings;
+    a previous query within `threshold` returns its stored winner. Entries expire after
+    `ttl_seconds` and the least recently used are evicted beyond `max_entries`. Rows
+    live in SQLite so the cache survives restarts; the embeddings are also held in
+    memory as one matrix for lookups.
+    """
+
+    def __init__(self, db_file=QUERY_CACHE_DB, threshold=QUERY_CACHE_THRESHOLD,
+                 ttl_seconds=QUERY_CACHE_TTL_SECONDS, max_entries=QUERY_CACHE_MAX_ENTRIES):
+        self.db_file = db_file
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+        conn = sqlite3.connect(self.db_file)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS visual_queries (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                query TEXT,
+                embedding BLOB,
+                result TEXT,
+                created REAL,
+                last_used REAL
+            )
+        """)
+        conn.execute("DELETE FROM visual_queries WHERE created < ?", (time.time() - self.ttl_seconds,))
+        conn.commit()
+        rows = conn.execute("SELECT id, query, embedding, created FROM visual_queries").fetchall()
+        conn.close()
+
+        self._ids = [row[0] for row in rows]
+        self._queries = [row[1] for row in rows]
+        self._created = [row[3] for row in rows]
+        self._matrix = np.vstack([np.frombuffer(row[2], dtype=np.float32) for row in rows]) if rows else None
+
+    def _drop(self, positions):
+        positions = set(positions)
+        keep = [i for i in range(len(self._ids)) if i not in positions]
+        self._ids = [self._ids[i] for i in keep]
+        self._queries = [self._queries[i] for i in keep]
+        self._created = [self._created[i] for i in keep]
+        self._matrix = self._matrix[keep] if keep else None
+
+    def lookup(self, embedding):
+        """Returns (cached_query, result) for the closest fresh match, or None."""
+        with self._lock:
+            if self._matrix is None:
+                return None
+            scores = self._matrix @ np.asarray(embedding, dtype=np.float32)
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                return None
+
+            entry_id = self._ids[best]
+            conn = sqlite3.connect(self.db_file)
+            if time.time() - self._created[best] > self.ttl_seconds:
+                conn.execute("DELETE FROM visual_queries WHERE id = ?", (entry_id,))
+                conn.commit()
+                conn.close()
+                self._drop([best])
+                return None
+
+            row = conn.execute("SELECT result FROM visual_queries WHERE id = ?", (entry_id,)).fetchone()
+            conn.execute("UPDATE visual_queries SET last_used = ? WHERE id = ?", (time.time(), entry_id))
+            conn.commit()
+            conn.close()
+            return (self._queries[best], json.loads(row[0])) if row else None
+
+    def store(self, query, embedding, result):
+        """Caches `result` (a JSON-serializable dict) for `query`; returns the entry id."""
+        embedding = np.asarray(embedding, dtype=np.float32)
+        now = time.time()
+        with self._lock:
+            conn = sqlite3.connect(self.db_file)
+            cursor = conn.execute(
+                "INSERT INTO visual_queries (query, embedding, result, created, last_used) VALUES (?, ?, ?, ?, ?)",
+                (query, embedding.tobytes(), json.dumps(result), now, now)
+            )
+            entry_id = cursor.lastrowid
+            self._ids.append(entry_id)
+            self._queries.append(query)
+            self._created.append(now)
+            self._matrix = embedding[None, :] if self._matrix is None else np.vstack([self._matrix, embedding])
+
+            excess = len(self._ids) - self.max_entries
+            if excess > 0:
+                evicted = [row[0] for row in conn.execute(
+                    "SELECT id FROM visual_queries ORDER BY last_used ASC LIMIT ?", (excess,))]
+                conn.executemany("DELETE FROM visual_queries WHERE id = ?", [(i,) for i in evicted])
+                evicted = set(evicted)
+                self._drop([i for i, entry in enumerate(self._ids) if entry in evicted])
+            conn.commit()
+            conn.close()
+            return entry_id
+
+    def update(self, entry_id, result):
+        """Replaces the stored result, e.g. when a late provider delivers a better image."""
+        with self._lock:
+            conn = sqlite3.connect(self.db_file)
+            conn.execute("UPDATE visual_queries SET result = ? WHERE id = ?", (json.dumps(result), entry_id))
+            conn.commit()
+            conn.close()
+
+
+_query_cache = None
+_query_cache_lock = threading.Lock()
+
+
+def get_query_cache():
+    """Process-wide SemanticQueryCache."""
+    global _query_cache
+    if _query_cache is None:
+        with _query_cache_lock:
+            if _query_cache is None:
+                _query_cache = SemanticQueryCache()
+    return _query_cache
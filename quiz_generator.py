@@ -1,7 +1,8 @@
 import google.generativeai as genaia
-import sqlite3
 import os
 from dotenv import load_dotenv
+from transcripts import get_transcript_window, search_transcripts, TRANSCRIPT_TOKEN_BUDGET
+from quiz_intent import classify_intent
 
 class QuizGenerator:
     def __init__(self, db_file='class_data.db'):
@@ -11,18 +12,19 @@ class QuizGenerator:
         self.gemini_api_key = os.getenv("GEMINI_API_KEY")
         genaia.configure(api_key=self.gemini_api_key)
 
-    def get_text_transcriptions(self):
-        """Retrieve all transcriptions from the database and concatenate them."""
+    def get_text_transcriptions(self, session=None, since=None, until=None, last_minutes=None,
+                                max_tokens=TRANSCRIPT_TOKEN_BUDGET):
+        """Retrieve the most recent transcriptions that fit in `max_tokens`, oldest first.
+
+        The window can be narrowed to a recording session, a date range or the last N minutes.
+        """
         try:
-            conn = sqlite3.connect(self.db_file)
-            cursor = conn.cursor()
-            cursor.execute("SELECT text FROM text_recording ORDER BY timestamp DESC")
-            results = cursor.fetchall()
-            conn.close()
+            results = get_transcript_window(self.db_file, session=session, since=since, until=until,
+                                            last_minutes=last_minutes, max_tokens=max_tokens)
 
             if results:
-                # Concatenate all transcription texts
-                all_text = "\n".join([result[0] for result in results])
+                # Concatenate the transcription texts
+                all_text = "\n".join([result[2] for result in results])
                 return all_text
             else:
                 return "No transcriptions available."
@@ -30,43 +32,78 @@ class QuizGenerator:
             print(f"Error retrieving transcriptions: {e}")
             return "Error retrieving transcriptions."
 
-    def generate_quiz(self, topic):
-        """Generate a quiz based on the given topic and text transcriptions."""
+    def get_topic_transcriptions(self, topic, max_tokens=TRANSCRIPT_TOKEN_BUDGET, **window):
+        """Retrieve only the class passages relevant to `topic` (BM25 over the FTS index), or ''."""
         try:
-            # Determine the intent of the topic using Gemini
-            intent_prompt = (
-                f"Determine the topic on which i have to generate the quiz. "
-                f"Check for the topic for following: '{topic}'. "
-                f"Return only the topic if found; otherwise, if it says to use class data or just generate quiz then return 'None'."
-            )
-            model = genaia.GenerativeModel('gemini-2.0-flash')
-            intent_response = model.generate_content(intent_prompt)
-            intent = intent_response.text.strip()
+            results = search_transcripts(topic, self.db_file, max_tokens=max_tokens, **window)
+            return "\n".join([result[2] for result in results])
+        except Exception as e:
+            print(f"Error searching transcriptions: {e}")
+            return ""
+
+    def detect_topic_with_llm(self, topic, model):
+        """Asks Gemini for the quiz topic; returns None if the request means "use class data"."""
+        intent_prompt = (
+            f"Determine the topic on which i have to generate the quiz. "
+            f"Check for the topic for following: '{topic}'. "
+            f"Return only the topic if found; otherwise, if it says to use class data or just generate quiz then return 'None'."
+        )
+        intent_response = model.generate_content(intent_prompt)
+        intent = intent_response.text.strip()
+        return None if intent == "None" else intent
 
-            # Use text transcriptions if intent is not found
-            text = self.get_text_transcriptions() if intent == "None" else topic
+    def build_quiz_prompt(self, topic, model, record_intent=True, **window):
+        """Works out what the quiz should cover and returns the generation prompt."""
+        # Determine the intent locally; Gemini is asked only when the local step is unsure
+        intent = classify_intent(topic, lambda text: self.detect_topic_with_llm(text, model), record=record_intent)
 
-            # Use Gemini to generate quiz questions
-            prompt = (
-                f"Generate few multiple-choice quiz questions based on the following text, focusing on the topic of:\n\n"
-                f"{text}\n\n"
-                f"Each question should have 4 answer options (A, B, C, D) with one correct answer. "
-                f"Indicate the correct answer after each question in parenthesis. "
-                f"Format each question like this:\n\n"
-                f"Question: [Question text]\n"
-                f"A) [Option A]\n"
-                f"B) [Option B]\n"
-                f"C) [Option C]\n"
-                f"D) [Option D]\n"
-                f"(Correct Answer: [Letter of correct answer])\n\n"
-                f"- If no text transcription is present, then return 'None' without any explanation."
-            )
+        # Use text transcriptions if intent is not found
+        if intent is None:
+            text = self.get_text_transcriptions(**window)
+        else:
+            # Ground the quiz in what was taught about the topic, when the class covered it
+            passages = self.get_topic_transcriptions(intent, **window)
+            text = f"{topic}\n\nWhat was said in class about it:\n{passages}" if passages else topic
 
-            response = model.generate_content(prompt)
+        return (
+            f"Generate few multiple-choice quiz questions based on the following text, focusing on the topic of:\n\n"
+            f"{text}\n\n"
+            f"Each question should have 4 answer options (A, B, C, D) with one correct answer. "
+            f"Indicate the correct answer after each question in parenthesis. "
+            f"Format each question like this:\n\n"
+            f"Question: [Question text]\n"
+            f"A) [Option A]\n"
+            f"B) [Option B]\n"
+            f"C) [Option C]\n"
+            f"D) [Option D]\n"
+            f"(Correct Answer: [Letter of correct answer])\n\n"
+            f"- If no text transcription is present, then return 'None' without any explanation."
+        )
+
+    def generate_quiz(self, topic, record_intent=True, **window):
+        """Generate a quiz based on the given topic and text transcriptions.
+
+        `window` (session, since, until, last_minutes) limits which class data is used.
+        Background callers pass record_intent=False to keep out of the intent stats.
+        """
+        try:
+            model = genaia.GenerativeModel('gemini-2.0-flash')
+            response = model.generate_content(self.build_quiz_prompt(topic, model, record_intent, **window))
             if response.text:
                 return response.text
             else:
                 return None
         except Exception as e:
             print(f"Error generating quiz: {e}")
-            return "Failed to generate quiz."
\ No newline at end of file
+            return "Failed to generate quiz."
+
+    def generate_quiz_stream(self, topic, **window):
+        """Like generate_quiz, but yields the quiz text in pieces as Gemini produces it."""
+        try:
+            model = genaia.GenerativeModel('gemini-2.0-flash')
+            for chunk in model.generate_content(self.build_quiz_prompt(topic, model, **window), stream=True):
+                if chunk.text:
+                    yield chunk.text
+        except Exception as e:
+            print(f"Error generating quiz: {e}")
+            yield "Failed to generate quiz."
\ No newline at end of file
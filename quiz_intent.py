@@ -0,0 +1,159 @@
+"""Local intent step for quiz requests.
+
+Decides whether a request names a topic ("quiz on photosynthesis") or asks for a quiz
+from class data ("make a quiz from today's lesson") without a Gemini round trip.
+Rules settle the common phrasings in microseconds. When they find no topic but aren't
+sure the request means class data ("quiz me on that"), an optional MiniLM comparison
+against example class-data requests gets a say. Everything else the rules can't
+settle goes to the LLM, including any request that names both a topic and the class
+("quiz on Newton's laws for the class"). `intent_stats()` reports how often each
+path was taken.
+"""
+import os
+import re
+import threading
+from collections import Counter
+
+INTENT_CONFIDENCE_THRESHOLD = float(os.getenv("QUIZ_INTENT_THRESHOLD", "0.75"))
+USE_INTENT_EMBEDDINGS = os.getenv("QUIZ_INTENT_EMBEDDINGS", "1") == "1"
+
+CLASS_DATA_PATTERN = re.compile(
+    r"\b(class( data)?|lecture|lesson|session|today|yesterday|this week|transcripts?|recorded|"
+    r"we (studied|learned|learnt|covered|discussed|did|went over)|what (was|we) (taught|covered))\b"
+)
+# Greedy prefix: the topic is the last "on/about ..." phrase ("a quiz for grade 5 on fractions")
+TOPIC_PATTERN = re.compile(r".*\b(?:on|about|regarding|covering)\s+(?:the\s+topics?\s+(?:of\s+)?)?(.+)$")
+REQUEST_WORDS = {
+    "a", "an", "the", "some", "few", "me", "us", "please", "can", "could", "you", "i", "want", "need",
+    "generate", "create", "make", "give", "prepare", "build", "write", "quiz", "quizzes", "test",
+    "questions", "question", "mcq", "mcqs", "multiple", "choice", "short", "quick", "new", "just",
+    "for", "my", "our", "students", "kids", "children", "now", "based", "on", "and", "with",
+    "small", "little", "tiny", "mini", "brief", "big", "large", "long", "easy", "simple", "hard", "difficult",
+    "one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten",
+}
+# Greetings, thanks and the wake phrase carry no intent
+FILLER_WORDS = {"hi", "hello", "hey", "ok", "okay", "so", "um", "uh", "thanks", "thank", "pls", "plz", "echo", "jarvis"}
+# Words that can sit next to class-data phrases without naming a topic ("from today's lesson")
+CLASS_CONTEXT_WORDS = {"'s", "s", "we", "had", "from", "in", "of", "to", "this", "that", "last", "what", "all",
+                       "everything", "data", "recording", "recordings", "notes", "discussion", "taught", "covered"}
+# Pronouns and pointing words that refer to something without naming a topic ("quiz me on that")
+DEICTIC_WORDS = {"it", "that", "this", "these", "those", "them", "there", "stuff", "thing", "things", "something",
+                 "same", "earlier", "before", "above", "went", "over", "topic", "topics", "subject"}
+CLASS_DATA_EXAMPLES = [
+    "generate a quiz from today's class",
+    "make a quiz based on what we studied",
+    "quiz the students on the lesson we just had",
+    "use the class data to create questions",
+    "create questions from the lecture recording",
+]
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+_example_vectors = None
+
+
+def _record(path):
+    with _stats_lock:
+        _stats[path] += 1
+
+
+def intent_stats():
+    """Counts of requests settled by each path: rules, embedding and llm."""
+    with _stats_lock:
+        total = sum(_stats.values())
+        return {"total": total, **{path: _stats[path] for path in ("rules", "embedding", "llm")}}
+
+
+def _content_words(text):
+    return [word for word in re.findall(r"[\w'-]+", text)
+            if word not in REQUEST_WORDS | FILLER_WORDS and not word.isdigit()]
+
+
+def _only_points_elsewhere(phrase):
+    """True when the phrase is just pronouns and pointing words ("the stuff from earlier")."""
+    return all(word in DEICTIC_WORDS | CLASS_CONTEXT_WORDS for word in _content_words(phrase))
+
+
+def _trim_request_words(phrase):
+    """Drops request filler from both ends: "my students on photosynthesis please" -> "photosynthesis"."""
+    words = phrase.split()
+    while words and words[0].strip(",;:") in REQUEST_WORDS | FILLER_WORDS | {"on", "about", "of"}:
+        words.pop(0)
+    while words and words[-1].strip(",;:") in REQUEST_WORDS | FILLER_WORDS:
+        words.pop()
+    return " ".join(words)
+
+
+def _words_beside_class_data(phrase):
+    """Content words left once class-data phrases are removed; none means a pure class-data request."""
+    rest = CLASS_DATA_PATTERN.sub(" ", phrase)
+    return [word for word in _content_words(rest) if word not in CLASS_CONTEXT_WORDS]
+
+
+def classify_by_rules(request_text):
+    """Returns (topic or None, confidence); None means "use class data".
+
+    Requests the rules can't read come back below the threshold: with the best topic
+    guess when a topic may be named (a topic next to class words, a few bare words),
+    or with None when the request only points at something ("quiz me on that").
+    """
+    text = request_text.lower().strip().rstrip("?.! ")
+    match = TOPIC_PATTERN.search(text)
+    if match:
+        candidate = _trim_request_words(match.group(1))
+        if CLASS_DATA_PATTERN.search(candidate):
+            # "quiz on today's lesson" vs "quiz on newtons laws for the class"
+            return (candidate, 0.5) if _words_beside_class_data(candidate) else (None, 0.9)
+        if _content_words(candidate):
+            return (None, 0.5) if _only_points_elsewhere(candidate) else (candidate, 0.9)
+
+    if CLASS_DATA_PATTERN.search(text):
+        words = _words_beside_class_data(text)
+        return (" ".join(words), 0.5) if words else (None, 0.85)
+
+    words = _content_words(text)
+    if not words:
+        return None, 0.95  # Just "generate a quiz", greetings aside
+    if _only_points_elsewhere(text):
+        return None, 0.5
+    return " ".join(words), 0.5
+
+
+def classify_by_embedding(request_text):
+    """Returns (None, similarity) for the closest class-data example, or None if unavailable."""
+    global _example_vectors
+    try:
+        import model_registry
+
+        model = model_registry.get_sentence_model()
+        if _example_vectors is None:
+            _example_vectors = model.encode(CLASS_DATA_EXAMPLES, normalize_embeddings=True)
+        query_vector = model.encode([request_text], normalize_embeddings=True)[0]
+        return None, float((_example_vectors @ query_vector).max())
+    except Exception as e:
+        print(f"❌ Intent embedding unavailable: {e}")
+        return None
+
+
+def classify_intent(request_text, llm_fallback, threshold=INTENT_CONFIDENCE_THRESHOLD, record=True):
+    """Returns the topic named by the request, or None to use class data.
+
+    `llm_fallback(request_text)` is called only when no local path is confident enough.
+    Pass record=False for background calls that shouldn't count in `intent_stats()`.
+    """
+    record_path = _record if record else (lambda path: None)
+    topic, confidence = classify_by_rules(request_text)
+    if confidence >= threshold:
+        record_path("rules")
+        return topic
+
+    # The embedding step can only confirm "use class data", so it is skipped when the
+    # rules saw a possible topic
+    if USE_INTENT_EMBEDDINGS and topic is None:
+        result = classify_by_embedding(request_text)
+        if result is not None and result[1] >= threshold:
+            record_path("embedding")
+            return result[0]
+
+    record_path("llm")
+    return llm_fallback(request_text)
@@ -0,0 +1,90 @@
+import os
+import wave
+
+
+class SessionRecorder:
+    """Streams a recording session to disk as fixed-length WAV segments.
+
+    Audio is flushed to the open segment every `flush_seconds`, so memory stays flat and
+    a crash loses at most one flush interval. When a segment reaches `segment_seconds`
+    it is closed and handed to `on_segment_closed` so it can be registered and transcribed.
+    """
+
+    def __init__(self, session, rate, channels, sample_width, segment_seconds=300,
+                 flush_seconds=1.0, folder=".", on_segment_closed=None):
+        self.session = session
+        self.rate = rate
+        self.channels = channels
+        self.sample_width = sample_width
+        self.folder = folder
+        self.on_segment_closed = on_segment_closed
+
+        self.frame_bytes = sample_width * channels
+        self.segment_frames = int(rate * segment_seconds)
+        self.flush_bytes = int(rate * flush_seconds) * self.frame_bytes
+
+        self._pending = bytearray()
+        self._wav = None
+        self._filename = None
+        self._segment_index = 0
+        self._segment_start_frame = 0
+        self._segment_frames_written = 0
+
+    def _segment_path(self):
+        return os.path.join(self.folder, f"recording_session_{self.session}_part{self._segment_index:03d}.wav")
+
+    def _open_segment(self):
+        self._filename = self._segment_path()
+        self._wav = wave.open(self._filename, 'wb')
+        self._wav.setnchannels(self.channels)
+        self._wav.setsampwidth(self.sample_width)
+        self._wav.setframerate(self.rate)
+        self._segment_frames_written = 0
+
+    def _flush(self):
+        if self._pending:
+            # wave patches the header on every write, so the file is playable after each flush.
+            self._wav.writeframes(bytes(self._pending))
+            self._pending.clear()
+
+    def _close_segment(self):
+        self._flush()
+        self._wav.close()
+        start_offset = self._segment_start_frame / self.rate
+        end_offset = (self._segment_start_frame + self._segment_frames_written) / self.rate
+        filename = self._filename
+
+        self._wav = None
+        self._segment_index += 1
+        self._segment_start_frame += self._segment_frames_written
+
+        print(f"💾 Segment closed: {filename} ({start_offset:.1f}s - {end_offset:.1f}s)")
+        if self.on_segment_closed:
+            try:
+                self.on_segment_closed(filename, session=self.session,
+                                       start_offset=start_offset, end_offset=end_offset)
+            except Exception as e:
+                print(f"❌ Error handling closed segment {filename}: {e}")
+
+    def write(self, data):
+        """Appends raw PCM, rotating to a new segment whenever the current one is full."""
+        view = memoryview(data)
+        while len(view):
+            if self._wav is None:
+                self._open_segment()
+
+            room = (self.segment_frames - self._segment_frames_written) * self.frame_bytes
+            part = view[:room]
+            self._pending += part
+            self._segment_frames_written += len(part) // self.frame_bytes
+            view = view[len(part):]
+
+            if self._segment_frames_written >= self.segment_frames:
+                self._close_segment()
+            elif len(self._pending) >= self.flush_bytes:
+                self._flush()
+
+    def close(self):
+        """Closes the final (possibly short) segment."""
+        if self._wav is not None:
+            self._close_segment()
@@ -1,41 +1,72 @@
+// Reads a Server-Sent Events response and appends each text chunk to the element as it arrives
+function streamText(url, options, elementId, emptyText) {
+    const element = document.getElementById(elementId);
+    element.innerText = "";
+    let text = "";
+    options.headers = Object.assign({ "Accept": "text/event-stream" }, options.headers);
+
+    return fetch(url, options).then(response => {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = "";
+
+        function handleEvent(rawEvent) {
+            let eventName = "message";
+            let data = "";
+            rawEvent.split("\n").forEach(line => {
+                if (line.startsWith("event: ")) eventName = line.slice(7);
+                else if (line.startsWith("data: ")) data += line.slice(6);
+            });
+            if (eventName === "message" && data) {
+                text += JSON.parse(data).text;
+                element.innerText = text;
+            } else if (eventName === "error") {
+                console.error("Stream error:", JSON.parse(data).error);
+            }
+        }
+
+        function read() {
+            return reader.read().then(({ done, value }) => {
+                if (done) {
+                    if (!text.trim() || text.trim() === "None") element.innerText = emptyText;
+                    return;
+                }
+                buffer += decoder.decode(value, { stream: true });
+                const events = buffer.split("\n\n");
+                buffer = events.pop();
+                events.forEach(handleEvent);
+                return read();
+            });
+        }
+        return read();
+    }).catch(error => {
+        console.error("Error:", error);
+        element.innerText = "An error occurred.";
+    });
+}
+
 // Function to get PDF summary
 function getPdfSummary() {
     const question = document.getElementById("pdf-question").value;
-    fetch("/pdf_summary", {
+    streamText("/pdf_summary", {
         method: "POST",
         headers: {
             "Content-Type": "application/json"
         },
         body: JSON.stringify({ question: question })
-    })
-    .then(response => response.json())
-    .then(data => {
-        document.getElementById("pdf-summary-result").innerText = data.response || "No summary available.";
-    })
-    .catch(error => {
-        console.error("Error:", error);
-        document.getElementById("pdf-summary-result").innerText = "An error occurred.";
-    });
+    }, "pdf-summary-result", "No summary available.");
 }
 
 // Function to generate a quiz
 function generateQuiz() {
     const input = document.getElementById("quiz-input").value;
-    fetch("/quiz_generator", {
+    streamText("/quiz_generator", {
         method: "POST",
         headers: {
             "Content-Type": "application/json"
         },
         body: JSON.stringify({ input: input })
-    })
-    .then(response => response.json())
-    .then(data => {
-        document.getElementById("quiz-result").innerText = data.quiz || "No quiz generated.";
-    })
-    .catch(error => {
-        console.error("Error:", error);
-        document.getElementById("quiz-result").innerText = "An error occurred.";
-    });
+    }, "quiz-result", "No quiz generated.");
 }
 
 // Function to generate an image
@@ -51,7 +82,11 @@ function generateVisual() {
     .then(response => response.json())
     .then(data => {
         if (data.best_image_url) {
-            document.getElementById("visual-result").innerHTML = `<img src="${data.best_image_url}" alt="Generated Image" style="max-width: 100%;">`;
+            showVisual(data.best_image_url);
+            // Sources that missed the deadline may still deliver a better image
+            if (data.upgrade_window > 0) {
+                checkVisualUpgrade(data.request_id, Date.now() + data.upgrade_window * 1000, data.best_image_url);
+            }
         } else {
             document.getElementById("visual-result").innerText = "No suitable image found.";
         }
@@ -62,19 +97,35 @@ function generateVisual() {
     });
 }
 
+function showVisual(imageUrl) {
+    document.getElementById("visual-result").innerHTML = `<img src="${imageUrl}" alt="Generated Image" style="max-width: 100%;">`;
+}
+
+const VISUAL_UPGRADE_POLL_MS = 2000;
+
+// Polls for late upgrades until the slowest source's timeout has passed
+function checkVisualUpgrade(requestId, until, shownUrl) {
+    setTimeout(() => {
+        fetch(`/visual_generator/${requestId}`)
+        .then(response => response.json())
+        .then(data => {
+            if (data.upgrade && data.upgrade.best_image_url !== shownUrl) {
+                shownUrl = data.upgrade.best_image_url;
+                showVisual(shownUrl);
+            }
+            if (Date.now() < until) {
+                checkVisualUpgrade(requestId, until, shownUrl);
+            }
+        })
+        .catch(error => console.error("Error:", error));
+    }, VISUAL_UPGRADE_POLL_MS);
+}
+
 // Function to get class summary
 function getClassSummary() {
-    fetch("/class_summary", {
+    streamText("/class_summary", {
         method: "GET"
-    })
-    .then(response => response.json())
-    .then(data => {
-        document.getElementById("class-summary-result").innerText = data.class_summary || "No class summary available.";
-    })
-    .catch(error => {
-        console.error("Error:", error);
-        document.getElementById("class-summary-result").innerText = "An error occurred.";
-    });
+    }, "class-summary-result", "No class summary available.");
 }
 
 let isRecording = false;
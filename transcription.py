@@ -0,0 +1,170 @@
+import concurrent.futures
+import json
+import os
+from datetime import datetime
+
+import speech_recognition as sr
+
+from transcripts import TRANSCRIPT_DB, TIMESTAMP_FORMAT, connect
+
+
+class TranscriptionStream:
+    """Incremental transcription session fed with consecutive PCM chunks.
+
+    `on_partial(text)` fires with the in-progress hypothesis, `on_final(text)` once per
+    finished utterance.
+    """
+
+    def __init__(self, backend, on_partial=None, on_final=None):
+        self.backend = backend
+        self.on_partial = on_partial
+        self.on_final = on_final
+
+    def _emit_final(self, text):
+        if text and self.on_final:
+            self.on_final(text)
+
+    def accept(self, pcm):
+        raise NotImplementedError
+
+    def finish(self):
+        """Finalizes whatever audio is still pending."""
+        raise NotImplementedError
+
+
+class BufferedTranscriptionStream(TranscriptionStream):
+    """Stream adapter for clip-only backends.
+
+    Audio is buffered and finalized every `window_seconds` on a worker thread, so the
+    caller keeps draining the microphone while the backend works.
+    """
+
+    def __init__(self, backend, rate, sample_width, on_partial=None, on_final=None, window_seconds=30):
+        super().__init__(backend, on_partial, on_final)
+        self.rate = rate
+        self.sample_width = sample_width
+        self.window_bytes = int(rate * window_seconds) * sample_width
+        self._buffer = bytearray()
+        self._worker = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+    def _transcribe_window(self, pcm):
+        try:
+            self._emit_final(self.backend.transcribe(pcm, self.rate, self.sample_width))
+        except Exception as e:
+            print(f"❌ Error transcribing audio window: {e}")
+
+    def accept(self, pcm):
+        self._buffer += pcm
+        if len(self._buffer) >= self.window_bytes:
+            self._worker.submit(self._transcribe_window, bytes(self._buffer))
+            self._buffer.clear()
+
+    def finish(self):
+        """Finalizes whatever audio is still pending and waits for queued windows."""
+        if self._buffer:
+            self._worker.submit(self._transcribe_window, bytes(self._buffer))
+            self._buffer.clear()
+        self._worker.shutdown(wait=True)
+
+
+class TranscriptionBackend:
+    """Speech-to-text engine interface."""
+
+    name = "base"
+
+    def transcribe(self, pcm, rate, sample_width):
+        """Transcribes a complete clip; returns '' when nothing intelligible was said."""
+        raise NotImplementedError
+
+    def stream(self, rate, sample_width, on_partial=None, on_final=None, **kwargs):
+        return BufferedTranscriptionStream(self, rate, sample_width, on_partial, on_final, **kwargs)
+
+
+class GoogleTranscriber(TranscriptionBackend):
+    """Google Web Speech via speech_recognition; one network round trip per clip."""
+
+    name = "google"
+
+    def __init__(self):
+        self.recognizer = sr.Recognizer()
+
+    def transcribe(self, pcm, rate, sample_width):
+        audio_data = sr.AudioData(pcm, rate, sample_width)
+        try:
+            return self.recognizer.recognize_google(audio_data).lower()
+        except sr.UnknownValueError:
+            return ""
+
+
+class VoskStream(TranscriptionStream):
+    """Streams audio straight into a Kaldi recognizer, emitting partials as they change."""
+
+    def __init__(self, backend, rate, on_partial=None, on_final=None):
+        super().__init__(backend, on_partial, on_final)
+        self.recognizer = backend.new_recognizer(rate)
+        self._last_partial = ""
+
+    def accept(self, pcm):
+        if self.recognizer.AcceptWaveform(bytes(pcm)):
+            self._last_partial = ""
+            self._emit_final(json.loads(self.recognizer.Result()).get("text", ""))
+        elif self.on_partial:
+            partial = json.loads(self.recognizer.PartialResult()).get("partial", "")
+            if partial and partial != self._last_partial:
+                self._last_partial = partial
+                self.on_partial(partial)
+
+    def finish(self):
+        self._last_partial = ""
+        self._emit_final(json.loads(self.recognizer.FinalResult()).get("text", ""))
+
+
+class VoskTranscriber(TranscriptionBackend):
+    """Offline Kaldi engine (needs `pip install vosk` and a model from alphacephei.com/vosk/models)."""
+
+    name = "vosk"
+
+    def __init__(self, model_path=None):
+        try:
+            import vosk
+        except ImportError as e:
+            raise ImportError("The 'vosk' package is required for STT_BACKEND=vosk.") from e
+
+        vosk.SetLogLevel(-1)
+        self._vosk = vosk
+        self.model = vosk.Model(model_path or os.getenv("VOSK_MODEL_PATH", "vosk-model-small-en-us-0.15"))
+
+    def new_recognizer(self, rate):
+        return self._vosk.KaldiRecognizer(self.model, rate)
+
+    def transcribe(self, pcm, rate, sample_width):
+        recognizer = self.new_recognizer(rate)
+        recognizer.AcceptWaveform(bytes(pcm))
+        return json.loads(recognizer.FinalResult()).get("text", "")
+
+    def stream(self, rate, sample_width, on_partial=None, on_final=None, **kwargs):
+        return VoskStream(self, rate, on_partial, on_final)
+
+
+TRANSCRIPTION_BACKENDS = {
+    GoogleTranscriber.name: GoogleTranscriber,
+    VoskTranscriber.name: VoskTranscriber,
+}
+
+
+def get_transcriber(name=None):
+    """Builds the backend named by `name` or the STT_BACKEND env var (default: google)."""
+    name = (name or os.getenv("STT_BACKEND", "google")).lower()
+    if name not in TRANSCRIPTION_BACKENDS:
+        raise ValueError(f"Unknown STT backend '{name}'. Choose from: {', '.join(TRANSCRIPTION_BACKENDS)}")
+    return TRANSCRIPTION_BACKENDS[name]()
+
+
+def save_transcript(text, db_file=TRANSCRIPT_DB, timestamp=None, session=None):
+    """Appends one finished transcript segment to the text_recording table."""
+    timestamp = timestamp or datetime.now().strftime(TIMESTAMP_FORMAT)
+    conn = connect(db_file)
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO text_recording (timestamp, text, session) VALUES (?, ?, ?)", (timestamp, text, session))
+    conn.commit()
+    conn.close()
@@ -0,0 +1,189 @@
+"""Access to the class transcripts in class_data.db (table text_recording).
+
+Rows are read through a cursor, newest first, and reading stops as soon as the token
+budget is used up, so prompt size stays flat however much class history is recorded.
+A (timestamp) index and a (session, timestamp) index serve the windowed queries.
+
+An FTS5 table (text_recording_fts) indexes the same rows for BM25 topic search. It is
+an external-content table kept in sync by triggers, so the text is stored only once.
+"""
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+TRANSCRIPT_DB = "class_data.db"
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+TRANSCRIPT_TOKEN_BUDGET = int(os.getenv("TRANSCRIPT_TOKEN_BUDGET", "8000"))
+CHARS_PER_TOKEN = 4  # Rough average for English text
+FETCH_ROWS = 100
+TOPIC_MATCH_LIMIT = 200  # Best-ranked passages considered per topic search
+STOPWORDS = {"a", "an", "and", "the", "of", "on", "in", "to", "for", "about", "quiz", "generate",
+             "make", "me", "some", "questions", "question", "topic", "what", "is", "are", "with"}
+
+_schema_ready = set()
+_schema_lock = threading.Lock()
+
+
+def ensure_schema(conn, db_file=None):
+    """Creates text_recording and its indexes, and adds columns older databases lack."""
+    if db_file is not None and db_file in _schema_ready:
+        return
+    with _schema_lock:
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS text_recording (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TEXT,
+                text TEXT
+            )
+        """)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(text_recording)")}
+        if "session" not in columns:
+            conn.execute("ALTER TABLE text_recording ADD COLUMN session TEXT")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_text_recording_timestamp ON text_recording (timestamp)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_text_recording_session ON text_recording (session, timestamp)")
+        _ensure_fts(conn)
+        conn.commit()
+        if db_file is not None:
+            _schema_ready.add(db_file)
+
+
+def _ensure_fts(conn):
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'text_recording_fts'").fetchone():
+        return
+    try:
+        conn.execute("""
+            CREATE VIRTUAL TABLE text_recording_fts USING fts5(
+                text, content='text_recording', content_rowid='id', tokenize='porter unicode61'
+            )
+        """)
+    except sqlite3.OperationalError as e:
+        print(f"⚠️ FTS5 unavailable, topic search disabled: {e}")
+        return
+    conn.executescript("""
+        CREATE TRIGGER IF NOT EXISTS text_recording_fts_insert AFTER INSERT ON text_recording BEGIN
+            INSERT INTO text_recording_fts (rowid, text) VALUES (new.id, new.text);
+        END;
+        CREATE TRIGGER IF NOT EXISTS text_recording_fts_delete AFTER DELETE ON text_recording BEGIN
+            INSERT INTO text_recording_fts (text_recording_fts, rowid, text) VALUES ('delete', old.id, old.text);
+        END;
+        CREATE TRIGGER IF NOT EXISTS text_recording_fts_update AFTER UPDATE OF text ON text_recording BEGIN
+            INSERT INTO text_recording_fts (text_recording_fts, rowid, text) VALUES ('delete', old.id, old.text);
+            INSERT INTO text_recording_fts (rowid, text) VALUES (new.id, new.text);
+        END;
+    """)
+    # Index the rows recorded before the table existed
+    conn.execute("INSERT INTO text_recording_fts (text_recording_fts) VALUES ('rebuild')")
+    print("🔎 Built the transcript topic index")
+
+
+def connect(db_file=TRANSCRIPT_DB):
+    conn = sqlite3.connect(db_file)
+    ensure_schema(conn, db_file)
+    return conn
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _as_timestamp(value):
+    return value.strftime(TIMESTAMP_FORMAT) if isinstance(value, datetime) else value
+
+
+def window_conditions(session=None, since=None, until=None, last_minutes=None, table="text_recording"):
+    """SQL conditions and parameters restricting `table` to a transcript window."""
+    if last_minutes is not None:
+        since = datetime.now() - timedelta(minutes=last_minutes)
+
+    conditions, params = [], []
+    if session is not None:
+        conditions.append(f"{table}.session = ?")
+        params.append(session)
+    if since is not None:
+        conditions.append(f"{table}.timestamp >= ?")
+        params.append(_as_timestamp(since))
+    if until is not None:
+        conditions.append(f"{table}.timestamp <= ?")
+        params.append(_as_timestamp(until))
+    return conditions, params
+
+
+def iter_transcripts(db_file=TRANSCRIPT_DB, session=None, since=None, until=None, last_minutes=None):
+    """Yields (id, timestamp, text) rows, newest first, fetching FETCH_ROWS at a time.
+
+    `since`/`until` are datetimes or '%Y-%m-%d %H:%M:%S' strings (inclusive);
+    `last_minutes` is shorthand for since = now - last_minutes.
+    """
+    conditions, params = window_conditions(session, since, until, last_minutes)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    conn = connect(db_file)
+    try:
+        cursor = conn.execute(
+            f"SELECT id, timestamp, text FROM text_recording {where} ORDER BY timestamp DESC, id DESC", params
+        )
+        while True:
+            rows = cursor.fetchmany(FETCH_ROWS)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        conn.close()
+
+
+def get_transcript_window(db_file=TRANSCRIPT_DB, session=None, since=None, until=None, last_minutes=None,
+                          max_tokens=TRANSCRIPT_TOKEN_BUDGET):
+    """Returns the most recent transcript rows that fit in `max_tokens`, oldest first."""
+    selected, used = [], 0
+    for row in iter_transcripts(db_file, session, since, until, last_minutes):
+        cost = estimate_tokens(row[2] or "")
+        if used + cost > max_tokens:
+            break
+        selected.append(row)
+        used += cost
+    selected.reverse()
+    return selected
+
+
+def topic_match_query(topic):
+    """Turns free text into an FTS5 query that matches any of its content words."""
+    words = [w for w in re.findall(r"\w+", topic.lower()) if w not in STOPWORDS and len(w) > 1]
+    return " OR ".join(f'"{w}"' for w in dict.fromkeys(words))
+
+
+def search_transcripts(topic, db_file=TRANSCRIPT_DB, session=None, since=None, until=None, last_minutes=None,
+                       max_tokens=TRANSCRIPT_TOKEN_BUDGET):
+    """Returns the transcript rows most relevant to `topic` (BM25) that fit in `max_tokens`.
+
+    Rows are (id, timestamp, text), oldest first. Returns [] when nothing matches.
+    """
+    match = topic_match_query(topic)
+    if not match:
+        return []
+    conditions, params = window_conditions(session, since, until, last_minutes)
+    where = "".join(f" AND {condition}" for condition in conditions)
+
+    conn = connect(db_file)
+    try:
+        cursor = conn.execute(f"""
+            SELECT text_recording.id, text_recording.timestamp, text_recording.text
+            FROM text_recording_fts JOIN text_recording ON text_recording.id = text_recording_fts.rowid
+            WHERE text_recording_fts MATCH ?{where}
+            ORDER BY bm25(text_recording_fts) LIMIT ?
+        """, [match] + params + [TOPIC_MATCH_LIMIT])
+        selected, used = [], 0
+        for row in cursor:
+            cost = estimate_tokens(row[2] or "")
+            if used + cost > max_tokens:
+                break
+            selected.append(row)
+            used += cost
+    except sqlite3.OperationalError as e:
+        print(f"❌ Topic search failed: {e}")
+        return []
+    finally:
+        conn.close()
+    # Present the passages in the order they were taught
+    return sorted(selected, key=lambda row: (row[1], row[0]))
@@ -1,13 +1,39 @@
-import requests, os
+import requests, os, time, threading
 from dotenv import load_dotenv
 from google import genai
 from google.genai import types
 from duckduckgo_search import DDGS
-from io import BytesIO
-from PIL import Image
-import base64, pickle, numpy as np, faiss, clip, torch
+import hashlib, numpy as np, clip, torch
 import concurrent.futures
-from sentence_transformers import SentenceTransformer
+from collections import OrderedDict
+from embedding_cache import EmbeddingCache
+import model_registry
+from image_index import get_image_index, get_clip_image_index
+from query_cache import get_query_cache
+from http_client import get_session, fetch_bytes, decode_image
+from image_store import get_image_store
+
+# Per-source timeouts (seconds) and the overall budget for one visual request. Ranking
+# starts RANKING_RESERVE_SECONDS before the budget ends, and candidate downloads get only
+# what is left of it. A slower source keeps its own timeout and can still deliver a late
+# upgrade. The clients are given the same timeouts so a straggler frees its worker.
+PROVIDER_TIMEOUTS = {
+    "Pre-generated": 2,
+    "Duckduckgo": 4,
+    "Gemini": 12,
+    "Google-Search": 4,
+}
+VISUAL_LATENCY_BUDGET = float(os.getenv("VISUAL_LATENCY_BUDGET", "6"))
+PREGENERATED_TOP_K = 3  # Library matches that compete when the CLIP index is built
+MIN_CANDIDATES = 2  # Start ranking once this many sources have answered...
+RANKING_GRACE_SECONDS = 0.5  # ...plus a short grace period for the rest
+RECENT_DOWNLOADS = 32  # Candidate bytes kept so the winner is stored without a second download
+UPGRADE_RANKING_SECONDS = 5  # Time to download and score a late candidate once it arrives
+RANKING_RESERVE_SECONDS = 2  # End of the budget kept for downloading, scoring and storing
+MIN_DOWNLOAD_SECONDS = 0.5  # Floor for a candidate download once the budget is nearly spent
+
+# Long-lived pool so a slow provider never holds up the request that started it
+_provider_executor = concurrent.futures.ThreadPoolExecutor(max_workers=16, thread_name_prefix="image-provider")
 
 
 class VisualGenerator:
@@ -17,19 +43,22 @@ class VisualGenerator:
         self.CX = os.getenv("GOOGLE_CX")
         self.GOOGLE_SEARCH_API_KEY = os.getenv("GOOGLE_SEARCH_API_KEY")
 
-        # Load AI Model (Fast & Lightweight)
-        self.sentence_model = SentenceTransformer("all-MiniLM-L6-v2")
-
-        # Load CLIP model
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        self.model, self.preprocess = clip.load("ViT-B/32", device=self.device)
+        # Models are loaded once per process and shared by every request
+        self.sentence_model = model_registry.get_sentence_model()
+        self.device = model_registry.get_device()
+        self.model, self.preprocess = model_registry.get_clip_model()
+        self.embedding_cache = EmbeddingCache()
+        self.image_store = get_image_store()
+        self._recent_downloads = OrderedDict()
+        self._recent_downloads_lock = threading.Lock()
 
     def upload_to_imgbb(self, image_base64):
         """Uploads base64 image to Imgbb and returns a public URL."""
         try:
-            response = requests.post(
+            response = get_session().post(
                 "https://api.imgbb.com/1/upload",
                 data={"key": "65af10f30a525eb2b66ef0c49062f1aa", "image": image_base64},
+                timeout=10,
             )
             response_json = response.json()
 
@@ -45,7 +74,7 @@ class VisualGenerator:
     def internet_sourced_image(self, query: str):
         try:
             url = f"https://www.googleapis.com/customsearch/v1?q={query}&cx={self.CX}&searchType=image&key={self.GOOGLE_SEARCH_API_KEY}"
-            response = requests.get(url)
+            response = get_session().get(url, timeout=PROVIDER_TIMEOUTS["Google-Search"])
             response.raise_for_status()
             response_json = response.json()
             image_url = response_json["items"][0]["link"]
@@ -62,7 +91,10 @@ class VisualGenerator:
 
     def generate_image_with_gemini(self, prompt: str):
         try:
-            client = genai.Client(api_key=self.GEMINI_API_KEY)
+            client = genai.Client(
+                api_key=self.GEMINI_API_KEY,
+                http_options=types.HttpOptions(timeout=PROVIDER_TIMEOUTS["Gemini"] * 1000)  # Milliseconds
+            )
             response = client.models.generate_content(
                 model="gemini-2.0-flash-exp-image-generation",
                 contents=prompt,
@@ -75,17 +107,15 @@ class VisualGenerator:
                 if part.text is not None:
                     print(part.text)
                 elif part.inline_data is not None:
-                    image_data = part.inline_data.data
-                    image_base64 = base64.b64encode(image_data).decode('utf-8')
-                    gemini_url = self.upload_to_imgbb(image_base64)
-                    return gemini_url
+                    # Stored locally; no round trip through imgbb on the critical path
+                    return self.image_store.put(part.inline_data.data)
         except Exception as e:
             print(f"Error generating image: {e}")
             return None
 
     def generate_image_with_duckduckgo(self, query: str):
         try:
-            with DDGS() as ddgs:
+            with DDGS(timeout=PROVIDER_TIMEOUTS["Duckduckgo"]) as ddgs:
                 search_results = list(ddgs.images(query, max_results=1))
 
             if search_results:
@@ -104,96 +134,316 @@ class VisualGenerator:
 
     def pre_generated_images_match(self, query):
         try:
-            index = faiss.read_index("faiss_index.bin")
-
-            # 🔹 Load dataset
-            with open("image_data.pkl", "rb") as f:
-                df = pickle.load(f)
-
             query_vector = self.sentence_model.encode([query])  # Convert query to vector
-            _, best_match_index = index.search(query_vector, 1)  # Search FAISS index
-
-            best_match_index = best_match_index[0][0]  # Get first result index
-            best_match_url = df.iloc[best_match_index]["photo_image_url"]
-            return best_match_url
+            matches = get_image_index().search(query_vector, 1)  # Search the resident FAISS index
+            return matches[0][0] if matches else None
         except Exception as e:
             print(f"Error in pre_generated_images_match: {e}")
             return None
 
-    def download_image(self, image_url):
-        """Downloads an image from a URL and returns a PIL image."""
+    def pre_generated_clip_matches(self, query, k=PREGENERATED_TOP_K):
+        """Top-k library images from the CLIP image index, as [(url, stored_embedding)]."""
         try:
-            response = requests.get(image_url, timeout=5)
-            response.raise_for_status()  # Raise an error for bad responses (404, etc.)
-            return Image.open(BytesIO(response.content)).convert("RGB")
+            text_embedding = self.encode_query(query)
+            matches = get_clip_image_index().search_with_vectors(text_embedding[None, :], k)
+            return [(url, vector) for url, _, vector in matches]
+        except Exception as e:
+            print(f"Error in pre_generated_clip_matches: {e}")
+            return None
+
+    def download_image_bytes(self, image_url, timeout=5):
+        """Downloads an image from a URL over the pooled session and returns its raw bytes."""
+        try:
+            if self.image_store.is_local(image_url):
+                return self.image_store.read(image_url)
+            return fetch_bytes(image_url, timeout=timeout)  # Streams, and gives up past MAX_IMAGE_BYTES
         except Exception as e:
             print(f"❌ Error downloading image {image_url}: {e}")
             return None
 
-    def compute_image_relevance(self, query, image_url):
-        """Computes relevance score using CLIP by comparing text and image embeddings."""
+    def download_image(self, image_url):
+        """Downloads an image from a URL and returns a PIL image reduced to about CLIP size."""
+        content = self.download_image_bytes(image_url)
+        if content is None:
+            return None
         try:
-            # Download and preprocess the image
-            image = self.download_image(image_url)
-            if image is None:
-                return -1, None  # Skip this image if download fails
+            return decode_image(content)
+        except Exception as e:
+            print(f"❌ Error decoding image {image_url}: {e}")
+            return None
+
+    def encode_query(self, query):
+        """Returns the L2-normalized CLIP text embedding of the query."""
+        with torch.inference_mode():
+            text_tokenized = clip.tokenize([query], truncate=True).to(self.device)
+            text_embedding = self.model.encode_text(text_tokenized).float()
+        return (text_embedding / text_embedding.norm(dim=-1, keepdim=True)).cpu().numpy()[0]
+
+    def encode_images(self, images):
+        """Returns L2-normalized CLIP embeddings for a list of PIL images, in one forward pass."""
+        with torch.inference_mode():
+            image_tensor = torch.stack([self.preprocess(image) for image in images]).to(self.device)
+            image_embeddings = self.model.encode_image(image_tensor).float()
+        return (image_embeddings / image_embeddings.norm(dim=-1, keepdim=True)).cpu().numpy()
+
+    def embed_image_urls(self, image_urls, timeout=5):
+        """Downloads and CLIP-encodes images not yet in the cache; returns {url: embedding}."""
+        # Downloads are I/O bound, so fetch all candidates at once
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(image_urls)) as executor:
+            contents = dict(zip(image_urls, executor.map(
+                lambda url: self.download_image_bytes(url, timeout), image_urls)))
+        self._remember_downloads(contents)
+
+        embeddings, new_entries, to_encode = {}, [], {}
+        for url, content in contents.items():
+            if content is None:
+                continue
+            content_hash = hashlib.sha256(content).hexdigest()
+            cached = self.embedding_cache.get_by_hash(content_hash)
+            if cached is not None:
+                # Same picture under a new URL
+                embeddings[url] = cached
+                new_entries.append((url, content_hash, cached))
+                continue
+            try:
+                to_encode[url] = (content_hash, decode_image(content))
+            except Exception as e:
+                print(f"❌ Error decoding image {url}: {e}")
 
-            image_tensor = self.preprocess(image).unsqueeze(0).to(self.device)
+        if to_encode:
+            try:
+                vectors = self.encode_images([image for _, image in to_encode.values()])
+                for (url, (content_hash, _)), vector in zip(to_encode.items(), vectors):
+                    embeddings[url] = vector
+                    new_entries.append((url, content_hash, vector))
+            except Exception as e:
+                print(f"Error processing images: {e}")
 
-            # Convert query text to CLIP embedding
-            text_tokenized = clip.tokenize([query]).to(self.device)
-            text_embedding = self.model.encode_text(text_tokenized).detach().cpu().numpy()
+        self.embedding_cache.put_many(new_entries)
+        return embeddings
 
-            # Get CLIP embedding for the image
-            image_embedding = self.model.encode_image(image_tensor).detach().cpu().numpy()
+    def _remember_downloads(self, contents):
+        with self._recent_downloads_lock:
+            for url, content in contents.items():
+                if content is not None:
+                    self._recent_downloads[url] = content
+                    self._recent_downloads.move_to_end(url)
+            while len(self._recent_downloads) > RECENT_DOWNLOADS:
+                self._recent_downloads.popitem(last=False)
 
-            # Compute cosine similarity
-            similarity_score = np.dot(text_embedding, image_embedding.T).flatten()[0]
-            return similarity_score, image
+    def store_image(self, image_url, timeout=5):
+        """Copies an image into the local store and returns its local URL.
 
+        Falls back to the original URL if the image cannot be fetched within `timeout`
+        or decoded.
+        """
+        if not image_url or self.image_store.is_local(image_url):
+            return image_url
+        with self._recent_downloads_lock:
+            content = self._recent_downloads.get(image_url)
+        if content is None:
+            content = self.download_image_bytes(image_url, timeout)
+        if content is None:
+            return image_url
+        try:
+            return self.image_store.put(content)
         except Exception as e:
-            print(f"Error processing image: {e}")
-            return -1, None  # Return low score if error
+            print(f"❌ Error storing image {image_url}: {e}")
+            return image_url
 
-    def choose_best_image(self, query, image_sources_url):
-        """Chooses the most relevant image from multiple sources."""
-        ranked_images = []
+    def rank_images(self, query, image_sources_url, known_embeddings=None, timeout=5):
+        """Scores every candidate against the query and returns [(score, source, url)], best first.
+
+        `known_embeddings` maps URLs to CLIP vectors that are already at hand (e.g. from
+        the CLIP image index); those candidates are never downloaded. Candidates that
+        can't be downloaded within `timeout` are left out.
+        """
+        candidates = {source: url for source, url in image_sources_url.items() if url}
+        if not candidates:
+            return []
+
+        # Previously seen images need neither a download nor a CLIP forward pass
+        unique_urls = list(dict.fromkeys(candidates.values()))
+        embeddings = {url: vector for url, vector in (known_embeddings or {}).items() if url in candidates.values()}
+        embeddings.update(self.embedding_cache.get_many([url for url in unique_urls if url not in embeddings]))
+        missing = [url for url in unique_urls if url not in embeddings]
+        if missing:
+            embeddings.update(self.embed_image_urls(missing, timeout))
 
-        for source, img_url in image_sources_url.items():
-            if img_url:
-                score, image = self.compute_image_relevance(query, img_url)
-                if image:
-                    ranked_images.append((score, source, image))
+        scored = {source: url for source, url in candidates.items() if url in embeddings}
+        if not scored:
+            return []
 
-        # Sort images by relevance (highest first)
+        try:
+            text_embedding = self.encode_query(query)
+        except Exception as e:
+            print(f"Error encoding query: {e}")
+            return []
+
+        # Cosine similarity of normalized embeddings
+        ranked_images = [(float(np.dot(embeddings[url], text_embedding)), source, url) for source, url in scored.items()]
         ranked_images.sort(reverse=True, key=lambda x: x[0])
+        return ranked_images
+
+    def compute_image_relevance(self, query, image_url):
+        """Computes relevance score using CLIP by comparing text and image embeddings."""
+        ranked_images = self.rank_images(query, {"image": image_url})
+        if not ranked_images:
+            return -1  # Return low score if download or scoring failed
+        return ranked_images[0][0]
+
+    def choose_best_image(self, query, image_sources_url):
+        """Chooses the most relevant image URL from multiple sources."""
+        ranked_images = self.rank_images(query, image_sources_url)
 
         if ranked_images:
             print(f"✅ Best Image Source: {ranked_images[0][1]}")
-            best_image = ranked_images[0][2]
-            remaining_images = [img[2] for img in ranked_images[1:]]  # Exclude the best image
-            return best_image, remaining_images
+            best_image_url = ranked_images[0][2]
+            remaining_image_urls = [img[2] for img in ranked_images[1:]]  # Exclude the best image
+            return best_image_url, remaining_image_urls
         else:
             print("❌ No suitable image found.")
             return None, []
 
+    def image_providers(self):
+        """Source name -> callable(query) returning a URL or a list of (url, embedding)."""
+        use_clip_index = get_clip_image_index().available()
+        return {
+            "Pre-generated": self.pre_generated_clip_matches if use_clip_index else self.pre_generated_images_match,
+            "Duckduckgo": self.generate_image_with_duckduckgo,
+            "Gemini": self.generate_image_with_gemini,
+            "Google-Search": self.internet_sourced_image,
+        }
+
+    def _consider_upgrade(self, query, source, future, deadline, best_score, on_upgrade):
+        """Ranks a provider that answered after ranking started and reports it if it wins."""
+        if future.cancelled() or future.exception() is not None or time.monotonic() > deadline:
+            return
+        url = future.result()
+        if isinstance(url, list):
+            url = url[0][0] if url else None
+        if not url:
+            return
+        ranked_images = self.rank_images(query, {source: url})
+        if ranked_images and ranked_images[0][0] > best_score:
+            print(f"⬆️ Late upgrade from {source}")
+            on_upgrade({"best_image_url": self.store_image(url), "best_source": source, "score": ranked_images[0][0]})
+
+    def run_image_generators_with_deadline(self, query, budget=None, on_upgrade=None, use_cache=True):
+        """Fans out to every provider and ranks whatever arrived within the latency budget.
+
+        Each source also has its own timeout from PROVIDER_TIMEOUTS, which may be longer
+        than the budget. Ranking starts RANKING_RESERVE_SECONDS before the budget ends, or
+        early once MIN_CANDIDATES have answered; downloading, scoring and storing the
+        candidates get only the rest of the budget. Sources still running at that point are dropped, unless `on_upgrade` is
+        given: then a late source that beats the best image so far before its own timeout
+        is passed to `on_upgrade`. `upgrade_window` in the result says how many seconds
+        upgrades may still arrive.
+
+        Results are kept in the semantic query cache, so a query close enough to an
+        earlier one returns that winner without calling any provider.
+        """
+        start = time.monotonic()
+        if use_cache:
+            query_cache = get_query_cache()
+            query_embedding = self.sentence_model.encode([query], normalize_embeddings=True)[0]
+            cached = query_cache.lookup(query_embedding)
+            if cached is not None:
+                cached_query, result = cached
+                print(f"♻️ Reusing visual for similar query: '{cached_query}'")
+                return dict(result, sources={"Cache": "ok"}, upgrade_window=0, elapsed=round(time.monotonic() - start, 3))
+
+        budget = VISUAL_LATENCY_BUDGET if budget is None else budget
+        futures = {_provider_executor.submit(func, query): source for source, func in self.image_providers().items()}
+        deadlines = {source: start + PROVIDER_TIMEOUTS.get(source, budget) for source in futures.values()}
+        budget_end = start + budget
+        ranking_at = budget_end - min(RANKING_RESERVE_SECONDS, budget / 2)
+
+        results, sources, known_embeddings = {}, {}, {}
+        pending = set(futures)
+        while pending:
+            now = time.monotonic()
+            for future in [f for f in pending if now >= deadlines[futures[f]]]:
+                pending.discard(future)
+                sources[futures[future]] = "timed_out"
+            if not pending or now >= ranking_at:
+                break
+
+            wake_at = min([ranking_at] + [deadlines[futures[f]] for f in pending])
+            done, _ = concurrent.futures.wait(pending, timeout=wake_at - now,
+                                              return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                pending.discard(future)
+                source = futures[future]
+                value = future.result() if future.exception() is None else None
+                if isinstance(value, list):
+                    # Several library matches, each with its stored CLIP vector
+                    for rank, (url, vector) in enumerate(value, start=1):
+                        results[source if rank == 1 else f"{source} #{rank}"] = url
+                        if vector is not None:
+                            known_embeddings[url] = vector
+                elif value:
+                    results[source] = value
+                sources[source] = "ok" if value else "failed"
+
+            # Sources, not entries: the library alone returns PREGENERATED_TOP_K candidates
+            if sum(status == "ok" for status in sources.values()) >= MIN_CANDIDATES:
+                ranking_at = min(ranking_at, time.monotonic() + RANKING_GRACE_SECONDS)
+
+        late = [f for f in pending if futures[f] not in sources]
+        for future in late:
+            sources[futures[future]] = "late"
+        upgrade_window = 0
+        if late and on_upgrade is not None:
+            last_deadline = max(deadlines[futures[f]] for f in late)
+            upgrade_window = round(last_deadline - time.monotonic() + UPGRADE_RANKING_SECONDS, 1)
+
+        # Select the most relevant image from the sources that made it, within what is left of the budget
+        remaining = lambda: max(MIN_DOWNLOAD_SECONDS, budget_end - time.monotonic())
+        ranked_images = self.rank_images(query, results, known_embeddings, timeout=remaining())
+        best_score = ranked_images[0][0] if ranked_images else float("-inf")
+        if ranked_images:
+            print(f"✅ Best Image Source: {ranked_images[0][1]}")
+        else:
+            print("❌ No suitable image found.")
+
+        result = {
+            "best_image_url": self.store_image(ranked_images[0][2], timeout=remaining()) if ranked_images else None,
+            "best_source": ranked_images[0][1] if ranked_images else None,
+            "score": best_score if ranked_images else None,
+            "remaining_image_urls": [img[2] for img in ranked_images[1:]],
+        }
+        entry_id = None
+        if use_cache and ranked_images:
+            entry_id = query_cache.store(query, query_embedding, result)
+
+        # Only drops sources that never started; running ones end on their client timeouts
+        for future in futures:
+            if sources[futures[future]] == "timed_out" or (future in late and on_upgrade is None):
+                future.cancel()
+        if on_upgrade is not None:
+            upgrade_lock = threading.Lock()
+            best_so_far = {"score": best_score}
+
+            def upgrade_and_cache(upgrade):
+                # Two late sources may both beat the first winner; keep the better one
+                with upgrade_lock:
+                    if upgrade["score"] <= best_so_far["score"]:
+                        return
+                    best_so_far["score"] = upgrade["score"]
+                    if entry_id is not None:
+                        query_cache.update(entry_id, dict(result, **upgrade))
+                    on_upgrade(upgrade)
+
+            for future in late:
+                source = futures[future]
+                future.add_done_callback(
+                    lambda f, source=source: self._consider_upgrade(
+                        query, source, f, deadlines[source], best_score, upgrade_and_cache))
+
+        return dict(result, sources=sources, upgrade_window=upgrade_window,
+                    elapsed=round(time.monotonic() - start, 3))
+
     def run_all_image_generators(self, query):
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            pregenereate_image = executor.submit(self.pre_generated_images_match, query)
-            duckduckgo_image = executor.submit(self.generate_image_with_duckduckgo, query)
-            gemini_image = executor.submit(self.generate_image_with_gemini, query)
-            interned_image = executor.submit(self.internet_sourced_image, query)
-
-            results = {
-                "Pre-generated": pregenereate_image.result(),
-                "Duckduckgo": duckduckgo_image.result(),
-                "Gemini": gemini_image.result(),
-                "Google-Search": interned_image.result(),
-            }
-
-        # Remove failed results
-        results = {k: v for k, v in results.items() if v}
-
-        # Select the most relevant image
-        best_image, remaining_images = self.choose_best_image(query, results)
-        return best_image, remaining_images
+        result = self.run_image_generators_with_deadline(query)
+        return result["best_image_url"], result["remaining_image_urls"]
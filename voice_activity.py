@@ -0,0 +1,172 @@
+import numpy as np
+
+
+def frame_rms(pcm):
+    """Root-mean-square energy of a 16-bit PCM buffer."""
+    samples = np.frombuffer(pcm, dtype=np.int16)
+    if samples.size == 0:
+        return 0.0
+    return float(np.sqrt(np.mean(samples.astype(np.float32) ** 2)))
+
+
+class SpeechDetector:
+    """Frame-level speech/non-speech decision with a threshold that follows the noise floor."""
+
+    def __init__(self, threshold=500.0, noise_ratio=3.0):
+        self.min_threshold = threshold
+        self.noise_ratio = noise_ratio
+        self.noise_floor = None
+
+    @property
+    def threshold(self):
+        if self.noise_floor is None:
+            return self.min_threshold
+        return max(self.min_threshold, self.noise_floor * self.noise_ratio)
+
+    def is_speech(self, pcm):
+        energy = frame_rms(pcm)
+        speech = energy >= self.threshold
+        if not speech:
+            # Track the background level from non-speech frames only.
+            self.noise_floor = energy if self.noise_floor is None else 0.95 * self.noise_floor + 0.05 * energy
+        return speech
+
+
+class EnergyEndpointer:
+    """Energy-based voice activity endpointer for short spoken commands.
+
+    Feed it consecutive PCM chunks; `feed` returns True once the speaker has gone quiet
+    for `trailing_silence_seconds`, nobody spoke within `no_speech_seconds`, or the
+    capture reached `max_seconds`.
+
+    The first `preroll_seconds` fed are audio from before capture began (the tail of a
+    wake word, say). They count toward `max_seconds` but never as speech, so silence
+    timing starts with the first word spoken after them.
+    """
+
+    def __init__(self, rate, threshold=500.0, noise_ratio=3.0, trailing_silence_seconds=0.8,
+                 max_seconds=5.0, no_speech_seconds=3.0, sample_width=2, preroll_seconds=0.0):
+        self.rate = rate
+        self.detector = SpeechDetector(threshold, noise_ratio)
+        self.trailing_silence_seconds = trailing_silence_seconds
+        self.max_seconds = max_seconds
+        self.no_speech_seconds = no_speech_seconds
+        self.sample_width = sample_width
+        self.preroll_seconds = preroll_seconds
+
+        self.elapsed = 0.0
+        self.silence_run = 0.0
+        self.speech_seen = False
+
+    @property
+    def threshold(self):
+        return self.detector.threshold
+
+    def feed(self, pcm):
+        """Consumes one chunk and returns True when capture should stop."""
+        duration = len(pcm) / (self.sample_width * self.rate)
+        in_preroll = self.elapsed < self.preroll_seconds
+        self.elapsed += duration
+
+        speech = self.detector.is_speech(pcm)
+        if not in_preroll:
+            if speech:
+                self.speech_seen = True
+                self.silence_run = 0.0
+            else:
+                self.silence_run += duration
+
+        if self.elapsed >= self.max_seconds:
+            return True
+        if self.speech_seen:
+            return self.silence_run >= self.trailing_silence_seconds
+        return self.elapsed - self.preroll_seconds >= self.no_speech_seconds
+
+
+class SpeechWindower:
+    """Groups continuous audio into speech windows for the autonomous agent.
+
+    Silence before the first word is never buffered (only `preroll_seconds` of it is
+    kept). Once a window is `target_seconds` long it is cut at the next pause of
+    `pause_seconds`, so sentences aren't split, and force-cut at `max_seconds`.
+    Windows with less than `min_speech_seconds` of speech are dropped. `feed` hands
+    finished windows over as a memoryview of their own buffer, without copying.
+    """
+
+    def __init__(self, rate, target_seconds=120, max_seconds=180, pause_seconds=0.7,
+                 min_speech_seconds=2.0, preroll_seconds=0.5, threshold=500.0, sample_width=2):
+        self.detector = SpeechDetector(threshold)
+        self.bytes_per_second = rate * sample_width
+        self.target_bytes = int(target_seconds * rate) * sample_width
+        self.max_bytes = int(max_seconds * rate) * sample_width
+        self.preroll_bytes = int(preroll_seconds * rate) * sample_width
+        self.pause_seconds = pause_seconds
+        self.min_speech_seconds = min_speech_seconds
+        self._reset()
+
+    def _reset(self):
+        self._buffer = bytearray()
+        self.speech_seconds = 0.0
+        self.silence_run = 0.0
+
+    def _cut(self):
+        window, speech_seconds = self._buffer, self.speech_seconds
+        self._reset()
+        if speech_seconds < self.min_speech_seconds:
+            print(f"🤫 Skipping window with only {speech_seconds:.1f}s of speech.")
+            return None
+        return memoryview(window)
+
+    def feed(self, pcm):
+        """Consumes one chunk; returns a finished window or None."""
+        duration = len(pcm) / self.bytes_per_second
+        speech = self.detector.is_speech(pcm)
+        self._buffer += pcm
+
+        if not self.speech_seconds and not speech:
+            # Still waiting for someone to talk: keep only the pre-roll.
+            if len(self._buffer) > self.preroll_bytes:
+                del self._buffer[:len(self._buffer) - self.preroll_bytes]
+            return None
+
+        if speech:
+            self.speech_seconds += duration
+            self.silence_run = 0.0
+        else:
+            self.silence_run += duration
+
+        if len(self._buffer) >= self.max_bytes:
+            return self._cut()
+        if len(self._buffer) >= self.target_bytes and self.silence_run >= self.pause_seconds:
+            return self._cut()
+        return None
+
+    def flush(self):
+        """Returns the pending window when the stream ends, if it holds enough speech."""
+        if not self.speech_seconds:
+            return None
+        return self._cut()
+
+
+def trim_silence(pcm, rate, threshold=500.0, frame_seconds=0.02, pad_seconds=0.1, sample_width=2):
+    """Drops leading and trailing silence, keeping `pad_seconds` around the speech.
+
+    Returns an empty bytes object when no frame rises above `threshold`.
+    """
+    frame_bytes = int(rate * frame_seconds) * sample_width
+    samples = np.frombuffer(pcm, dtype=np.int16)
+    frame_len = frame_bytes // sample_width
+    num_frames = samples.size // frame_len
+    if num_frames == 0:
+        return b""
+
+    frames = samples[:num_frames * frame_len].astype(np.float32).reshape(num_frames, frame_len)
+    energies = np.sqrt(np.mean(frames ** 2, axis=1))
+    voiced = np.flatnonzero(energies >= threshold)
+    if voiced.size == 0:
+        return b""
+
+    pad_bytes = int(rate * pad_seconds) * sample_width
+    start = max(0, voiced[0] * frame_bytes - pad_bytes)
+    end = min(len(pcm), (voiced[-1] + 1) * frame_bytes + pad_bytes)
+    return bytes(memoryview(pcm)[start:end])